@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+ics_export.py
+-----------------------------------
+iCalendar (.ics) 日历导出模块
+
+功能：
+- 每位干事导出一个日历文件，课表中的有课时段（连续节次合并）作为日程。
+- 导出一个群组日历，“多数干事无课” 的时间段作为日程，备注中给出无课人数。
+- 课表的周次按学期开始日期（须为周一）映射为真实日期，节次按作息时间映射为具体时刻，
+  时刻带 TZID=Asia/Shanghai 并附 VTIMEZONE 定义，日历应用按北京时间显示。
+- 以生成器逐条产生日程并边生成边写入文件，导出整个名单时不会把全部日程放进内存。
+- 记录每位干事课表数据的哈希和文件名，重新导出时跳过数据未变化的干事。
+
+输出目录结构：
+    manifest.json      每位干事的数据哈希与日历文件名
+    group_free.ics     群组空闲日历
+    members/           干事日历，文件名为 “姓名-姓名哈希前8位.ics”，不同姓名不会重名
+"""
+
+import hashlib
+import json
+import os
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+PRODID = "-//gbasamera//check_classtable//CN"
+MANIFEST_NAME = "manifest.json"
+GROUP_FEED_NAME = "group_free.ics"
+TIMEZONE = "Asia/Shanghai"
+# 日历文件格式版本；格式变化时递增，使已导出的日历全部重新生成
+FEED_FORMAT = 2
+MEMBER_DIR_NAME = "members"
+
+
+# ============================================
+# 一、iCalendar 文本格式
+# ============================================
+def _escape(text: str) -> str:
+    return (text.replace("\\", "\\\\").replace(";", "\\;")
+            .replace(",", "\\,").replace("\n", "\\n"))
+
+
+def _fold(line: str) -> str:
+    """按 RFC 5545 将超过 75 字节的行折行"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line
+    parts, current, size = [], "", 0
+    for char in line:
+        char_size = len(char.encode("utf-8"))
+        if size + char_size > (75 if not parts else 74):
+            parts.append(current)
+            current, size = "", 0
+        current += char
+        size += char_size
+    parts.append(current)
+    return "\r\n ".join(parts)
+
+
+def _format_time(moment: datetime) -> str:
+    return moment.strftime("%Y%m%dT%H%M%S")
+
+
+def _event(uid: str, start: datetime, end: datetime, summary: str, description: str, stamp: str) -> Iterator[str]:
+    yield "BEGIN:VEVENT"
+    yield f"UID:{uid}"
+    yield f"DTSTAMP:{stamp}"
+    yield f"DTSTART;TZID={TIMEZONE}:{_format_time(start)}"
+    yield f"DTEND;TZID={TIMEZONE}:{_format_time(end)}"
+    yield f"SUMMARY:{_escape(summary)}"
+    if description:
+        yield f"DESCRIPTION:{_escape(description)}"
+    yield "END:VEVENT"
+
+
+def _timezone() -> Iterator[str]:
+    """Asia/Shanghai 的 VTIMEZONE 定义（UTC+8，无夏令时）"""
+    yield "BEGIN:VTIMEZONE"
+    yield f"TZID:{TIMEZONE}"
+    yield "BEGIN:STANDARD"
+    yield "DTSTART:19700101T000000"
+    yield "TZOFFSETFROM:+0800"
+    yield "TZOFFSETTO:+0800"
+    yield "TZNAME:CST"
+    yield "END:STANDARD"
+    yield "END:VTIMEZONE"
+
+
+def _calendar(name: str, events: Iterable[str]) -> Iterator[str]:
+    yield "BEGIN:VCALENDAR"
+    yield "VERSION:2.0"
+    yield f"PRODID:{PRODID}"
+    yield "CALSCALE:GREGORIAN"
+    yield f"X-WR-CALNAME:{_escape(name)}"
+    yield f"X-WR-TIMEZONE:{TIMEZONE}"
+    yield from _timezone()
+    yield from events
+    yield "END:VCALENDAR"
+
+
+def write_feed(path: str, lines: Iterable[str]):
+    """逐行写入日历文件（先写临时文件，完成后替换，避免留下写了一半的文件）"""
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8', newline='') as f:
+        for line in lines:
+            f.write(_fold(line) + "\r\n")
+    os.replace(temp_path, path)
+
+
+# ============================================
+# 二、周次 / 节次 → 真实时间
+# ============================================
+def _slot_time(semester_start: date, week: int, weekday: int, minute: int) -> datetime:
+    """第 week 周、星期 weekday(1-7) 当天的第 minute 分钟（semester_start 为第1周周一）"""
+    day = semester_start + timedelta(weeks=week - 1, days=weekday - 1)
+    return datetime.combine(day, datetime.min.time()) + timedelta(minutes=minute)
+
+
+def _runs(periods: List[int], section_bounds: Dict[int, Tuple[int, int]]) -> Iterator[Tuple[int, int]]:
+    """将时间上首尾相接的节次合并为区间，如 [1,2,5] → (1,2), (5,5)；跨午休 / 晚饭的节次不合并"""
+    start = prev = None
+    for period in periods:
+        if start is None:
+            start = prev = period
+        elif period == prev + 1 and section_bounds[prev][1] == section_bounds[period][0]:
+            prev = period
+        else:
+            yield start, prev
+            start = prev = period
+    if start is not None:
+        yield start, prev
+
+
+def _uid(*parts) -> str:
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:16]
+    return f"{digest}@check_classtable"
+
+
+# ============================================
+# 三、日程生成器
+# ============================================
+def iter_member_events(name: str, table: List, semester_start: date,
+                       section_bounds: Dict[int, Tuple[int, int]], stamp: str) -> Iterator[str]:
+    """逐条生成单个干事的上课日程（同一天连续节次合并为一条）"""
+    weeks = max((len(flags) for row in table for flags in row), default=0)
+    days = max((len(row) for row in table), default=0)
+    for week in range(1, weeks + 1):
+        for weekday in range(1, days + 1):
+            busy = [
+                period for period in sorted(section_bounds)
+                if period <= len(table) and weekday <= len(table[period - 1])
+                and week <= len(table[period - 1][weekday - 1])
+                and table[period - 1][weekday - 1][week - 1] == 1
+            ]
+            for first, last in _runs(busy, section_bounds):
+                start = _slot_time(semester_start, week, weekday, section_bounds[first][0])
+                end = _slot_time(semester_start, week, weekday, section_bounds[last][1])
+                summary = f"有课（第{first}节）" if first == last else f"有课（第{first}-{last}节）"
+                yield from _event(_uid(name, week, weekday, first), start, end,
+                                  summary, f"{name} 第{week}周", stamp)
+
+
+def iter_group_free_events(free_counts: Dict[Tuple[int, int, int], int], total: int, weeks: int,
+                           semester_start: date, section_bounds: Dict[int, Tuple[int, int]],
+                           threshold: float, stamp: str) -> Iterator[str]:
+    """逐条生成 “多数干事无课” 的时间段（无课比例达到 threshold 的连续节次合并）"""
+    for week in range(1, weeks + 1):
+        for weekday in range(1, 8):
+            free = [
+                period for period in sorted(section_bounds)
+                if total and free_counts.get((week, weekday, period), total) / total >= threshold
+            ]
+            for first, last in _runs(free, section_bounds):
+                least = min(free_counts.get((week, weekday, period), total) for period in range(first, last + 1))
+                start = _slot_time(semester_start, week, weekday, section_bounds[first][0])
+                end = _slot_time(semester_start, week, weekday, section_bounds[last][1])
+                yield from _event(_uid("group", week, weekday, first, last), start, end,
+                                  f"多数干事无课（{least}/{total}人）",
+                                  f"第{week}周 第{first}-{last}节，至少 {least} 人无课", stamp)
+
+
+# ============================================
+# 四、整个名单导出（增量）
+# ============================================
+def _member_filename(name: str) -> str:
+    """干事日历文件名；清理后的姓名可能相同（如 “a b” 与 “a/b”），追加原姓名的哈希区分"""
+    safe = re.sub(r'[\\/:*?"<>|\s]+', "_", name).strip("_") or "unnamed"
+    return f"{safe}-{hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]}.ics"
+
+
+def _member_hash(person: Dict, settings: str) -> str:
+    payload = json.dumps(person, ensure_ascii=False, sort_keys=True, default=str) + settings
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def export_calendars(names: List[str], find_person: Callable[[str], Optional[Dict]], output_dir: str,
+                     semester_start: date, section_bounds: Dict[int, Tuple[int, int]],
+                     threshold: float = 0.5) -> Dict:
+    """
+    导出全部干事日历（output_dir/members/）和群组空闲日历到 output_dir，返回统计信息：
+        {"written": 重新生成的干事数, "skipped": 数据未变化跳过的干事数,
+         "group_written": 群组日历是否重新生成, "group_path": 群组日历路径,
+         "member_dir": 干事日历目录}
+    """
+    if semester_start.weekday() != 0:
+        raise ValueError(f"学期开始日期 {semester_start.isoformat()} 不是周一")
+    member_dir = os.path.join(output_dir, MEMBER_DIR_NAME)
+    if not os.path.exists(member_dir):
+        os.makedirs(member_dir)
+
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    # 旧版清单的值为哈希字符串，没有记录文件名，视为需要重新导出
+    old_members = {name: entry for name, entry in manifest.get("members", {}).items() if isinstance(entry, dict)}
+    new_members: Dict[str, Dict[str, str]] = {}
+
+    settings = f"|{FEED_FORMAT}|{semester_start.isoformat()}|{sorted(section_bounds.items())}"
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    stats = {"written": 0, "skipped": 0, "group_written": False,
+             "group_path": os.path.join(output_dir, GROUP_FEED_NAME), "member_dir": member_dir}
+
+    # 群组空闲统计只保留计数，按干事逐个累加
+    busy_counts: Dict[Tuple[int, int, int], int] = {}
+    valid = 0
+    max_weeks = 0
+    seen = set()
+    for name in names:
+        if name in seen:
+            continue
+        seen.add(name)
+        person = find_person(name) if name else None
+        if not person or not isinstance(person.get("table"), list):
+            continue
+        table = person["table"]
+        valid += 1
+        for period_idx, row in enumerate(table):
+            for weekday_idx, flags in enumerate(row):
+                max_weeks = max(max_weeks, len(flags))
+                for week_idx, flag in enumerate(flags):
+                    if flag == 1:
+                        key = (week_idx + 1, weekday_idx + 1, period_idx + 1)
+                        busy_counts[key] = busy_counts.get(key, 0) + 1
+
+        digest = _member_hash(person, settings)
+        filename = _member_filename(name)
+        new_members[name] = {"hash": digest, "file": filename}
+        path = os.path.join(member_dir, filename)
+        if old_members.get(name) == new_members[name] and os.path.exists(path):
+            stats["skipped"] += 1
+            continue
+        write_feed(path, _calendar(f"{name} 课表",
+                                   iter_member_events(name, table, semester_start, section_bounds, stamp)))
+        stats["written"] += 1
+
+    group_digest = hashlib.sha1(
+        (json.dumps({name: entry["hash"] for name, entry in new_members.items()}, sort_keys=True, ensure_ascii=False) + settings + f"|{threshold}").encode("utf-8")
+    ).hexdigest()
+    if manifest.get("group") != group_digest or not os.path.exists(stats["group_path"]):
+        free_counts = {key: valid - count for key, count in busy_counts.items()}
+        write_feed(stats["group_path"], _calendar(
+            "干事空闲时间",
+            iter_group_free_events(free_counts, valid, max_weeks, semester_start, section_bounds, threshold, stamp),
+        ))
+        stats["group_written"] = True
+
+    # 按清单记录的文件名删除已不在名单中的干事日历（只在 members/ 内删除）
+    live_files = {entry["file"] for entry in new_members.values()}
+    for name in set(old_members) - set(new_members):
+        filename = os.path.basename(str(old_members[name].get("file", "")))
+        stale = os.path.join(member_dir, filename)
+        if filename and filename not in live_files and os.path.isfile(stale):
+            os.remove(stale)
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({"members": new_members, "group": group_digest}, f, ensure_ascii=False, indent=2)
+    return stats
@@ -7,10 +7,28 @@ from astrbot.api import AstrBotConfig
 
 import json
 import os
-from datetime import datetime
+import re
+from datetime import datetime, date, timedelta
 from typing import List, Dict, Set, Optional
 from pathlib import Path
 
+from .natural_time_praser import (
+    SectionClock,
+    parse_clock_phrase,
+    parse_duration_minutes,
+    parse_natural_time as parse_natural_datetime,
+    relative_day_offset,
+)
+from .schedule_store import ScheduleStore
+from .sharded_backend import ShardedScheduleBackend
+from .query_context import QUERY_KEYWORDS, QueryContextStore, parse_follow_up
+from .reply_renderer import PAGE_BREAK, ReplyRenderer, summarize_names
+from .ics_export import export_calendars
+
+# 自动创建的示例数据中的干事
+SAMPLE_MEMBER_NAMES = ("王闯", "王雅馨", "杨彦萍", "姜元皓", "石浩霖")
+
+
 # 简化版自然语言时间解析器
 def parse_natural_time(text: str) -> Dict:
     """简化版自然语言时间解析器"""
@@ -51,10 +69,210 @@ class FreeMembersPlugin:
         初始化无课干事查询插件
         """
         self.conf = config
+        self.semester_start = self._parse_semester_start(self.conf.get("semester_start", ""))
 
-        self.data_file = self._find_or_create_data_file()
-        self.schedule_data = self.conf["pathfile"]
-        self.all_members = self.get_all_members()
+        self.data_file = self._find_or_create_data_file(self.conf.get("pathfile"))
+        self.schedule_data: List[Dict] = []
+        self.all_members: List[str] = []
+        self.data_generation = 0
+        self._person_index: Dict = {}
+        self._person_index_source = None
+
+        # 可选的 SQLite 存储后端
+        self.store: Optional[ScheduleStore] = None
+        if self.conf.get("storage_backend", "json") == "sqlite":
+            self.store = self._open_store()
+        if not self.store:
+            self.schedule_data = self.load_schedule_data()
+            self.all_members = self.get_all_members()
+        
+        # 可选的分片多进程查询后端（大规模名单）
+        self.sharded: Optional[ShardedScheduleBackend] = None
+        if self.conf.get("query_backend", "single") == "sharded":
+            self._build_sharded()
+
+        # 作息时间预计算表 + 按分钟缓存的实时查询结果
+        self.section_clock = SectionClock()
+        self._minute_cache_stamp = None
+        self._minute_cache: Dict[tuple, Dict] = {}
+
+        # 连续追问的查询上下文（按群和用户区分）
+        self.query_contexts = QueryContextStore(ttl=self.conf.get("context_ttl", 300) or 300)
+
+        # 回复渲染（模板 + 分页 + 缓存）
+        self.renderer = ReplyRenderer(max_chars=self.conf.get("reply_max_chars", 1500) or 1500)
+        self.reply_template = self.conf.get("reply_template", "full") or "full"
+    
+    @staticmethod
+    def _parse_semester_start(value: str) -> date:
+        """解析学期开始日期（第1周周一），格式 YYYY-MM-DD；不是周一时退回到所在周的周一"""
+        try:
+            start = datetime.strptime(value, "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            if value:
+                logger.warning(f"⚠️ 学期开始日期格式错误: {value}，使用默认值 2024-09-02")
+            return date(2024, 9, 2)
+        if start.weekday() != 0:
+            monday = start - timedelta(days=start.weekday())
+            logger.warning(f"⚠️ 学期开始日期 {value} 不是周一，按所在周的周一 {monday.isoformat()} 计算")
+            return monday
+        return start
+    
+    def _open_store(self) -> Optional[ScheduleStore]:
+        """打开 SQLite 课表库（为空时从 JSON 数据文件导入）"""
+        schedule_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schedule")
+        db_path = self.conf.get("sqlite_path") or os.path.join(schedule_dir, "schedules.db")
+        try:
+            store = ScheduleStore(db_path)
+            if store.count_members() == 0 and os.path.exists(self.data_file):
+                with open(self.data_file, 'r', encoding='utf-8') as f:
+                    records = json.load(f)
+                # 自动创建的示例数据不写入数据库，避免替换为真实课表后示例干事仍留在库中
+                if self._is_sample_data(records):
+                    logger.info("💡 数据文件仍为示例数据，暂不导入 SQLite；替换为真实课表后重启插件或发送 “导入课表”")
+                else:
+                    count = store.import_records(records)
+                    logger.info(f"✅ 已从 {self.data_file} 导入 {count} 个干事到 SQLite")
+            # 课表只保存在数据库中，内存里只保留姓名列表
+            self.all_members = store.get_all_members()
+            logger.info(f"✅ 使用 SQLite 课表库: {os.path.abspath(db_path)}")
+            return store
+        except Exception as e:
+            logger.error(f"❌ 打开 SQLite 课表库失败，改用 JSON 文件: {e}")
+            return None
+    
+    def _build_sharded(self):
+        """按当前名单重建分片查询后端"""
+        if self.sharded:
+            self.sharded.close()
+            self.sharded = None
+        if not self.member_count():
+            return
+        try:
+            self.sharded = ShardedScheduleBackend(
+                self.all_members, self._find_person, self.conf.get("shard_workers") or None
+            )
+            logger.info(f"✅ 已启用分片查询后端: {len(self.sharded.shards)} 个分片, {self.sharded.workers} 个进程")
+        except Exception as e:
+            logger.error(f"❌ 创建分片查询后端失败，改用单进程查询: {e}")
+            self.sharded = None
+    
+    def close(self):
+        """释放查询后端占用的进程和共享内存，关闭课表库连接"""
+        if self.sharded:
+            self.sharded.close()
+            self.sharded = None
+        if self.store:
+            self.store.close()
+    
+    def member_count(self) -> int:
+        """干事人数（SQLite 后端直接查询数据库）"""
+        if self.store:
+            return self.store.count_members()
+        return len(self.schedule_data) if isinstance(self.schedule_data, list) else 0
+    
+    def _data_changed(self, name: Optional[str] = None):
+        """
+        课表变更后更新分片后端并作废缓存：
+        只改动了名单中已有的单个干事（name）时原地改写其位图，否则重建
+        """
+        if self.sharded and not (name and self.sharded.update_member(name, self._find_person(name))):
+            self._build_sharded()
+        self.data_generation += 1
+        self._minute_cache_stamp = None
+        self._minute_cache = {}
+    
+    def upsert_member(self, record: Dict) -> str:
+        """新增或更新单个干事课表（仅 SQLite 后端）"""
+        if not self.store:
+            return "❌ 当前为 JSON 存储，请在配置中将 storage_backend 设为 sqlite"
+        try:
+            self.store.upsert_member(record)
+        except Exception as e:
+            logger.error(f"更新课表失败: {e}")
+            return f"❌ 更新课表失败: {str(e)}"
+        name = str(record["name"])
+        if name in self.all_members:
+            self._data_changed(name)
+        else:
+            self.all_members.append(name)
+            self._data_changed()
+        return f"✅ 已更新 {record.get('name')} 的课表 (共{len(self.all_members)}人)"
+    
+    def delete_member(self, name: str) -> str:
+        """删除单个干事（仅 SQLite 后端）"""
+        if not self.store:
+            return "❌ 当前为 JSON 存储，请在配置中将 storage_backend 设为 sqlite"
+        try:
+            existed = self.store.delete_member(name)
+        except Exception as e:
+            logger.error(f"删除干事失败: {e}")
+            return f"❌ 删除干事失败: {str(e)}"
+        if not existed:
+            return f"❌ 未找到干事: {name}"
+        self.all_members = [member for member in self.all_members if member != name]
+        self._data_changed()
+        return f"✅ 已删除 {name} (剩余{len(self.all_members)}人)"
+    
+    @staticmethod
+    def _schedule_file(filename: str) -> Optional[str]:
+        """将聊天中给出的文件名限制在插件的 schedule 文件夹内，越界时返回 None"""
+        schedule_dir = os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "schedule"))
+        path = os.path.realpath(os.path.join(schedule_dir, filename))
+        if os.path.commonpath([schedule_dir, path]) != schedule_dir or path == schedule_dir:
+            return None
+        return path
+    
+    def import_json_to_store(self, filename: str = "") -> str:
+        """从 JSON 文件整体导入到 SQLite（仅 SQLite 后端，文件须位于 schedule 文件夹内）"""
+        if not self.store:
+            return "❌ 当前为 JSON 存储，请在配置中将 storage_backend 设为 sqlite"
+        json_path = self._schedule_file(filename) if filename else self.data_file
+        if not json_path:
+            return "❌ 只能导入插件 schedule 文件夹内的文件"
+        try:
+            count = self.store.import_json(json_path)
+        except Exception as e:
+            logger.error(f"导入课表失败: {e}")
+            return f"❌ 导入课表失败: {str(e)}"
+        self.all_members = self.store.get_all_members()
+        self._data_changed()
+        return f"✅ 已从 {os.path.abspath(json_path)} 导入 {count} 个干事"
+    
+    def export_store_to_json(self, filename: str = "") -> str:
+        """将 SQLite 中的课表导出为 JSON 文件（仅 SQLite 后端，只能写入 schedule 文件夹）"""
+        if not self.store:
+            return "❌ 当前为 JSON 存储，请在配置中将 storage_backend 设为 sqlite"
+        json_path = self._schedule_file(filename or "all_schedules_export.json")
+        if not json_path:
+            return "❌ 只能导出到插件 schedule 文件夹内"
+        try:
+            count = self.store.export_json(json_path)
+        except Exception as e:
+            logger.error(f"导出课表失败: {e}")
+            return f"❌ 导出课表失败: {str(e)}"
+        return f"✅ 已导出 {count} 个干事的课表: {os.path.abspath(json_path)}"
+    
+    def export_calendars(self) -> str:
+        """导出每个干事的课表日历和群组空闲日历（.ics），数据未变化的干事跳过"""
+        if not self.member_count():
+            return "❌ 无课表数据，无法导出日历"
+        schedule_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schedule")
+        output_dir = os.path.join(schedule_dir, "ics")
+        try:
+            stats = export_calendars(
+                self.all_members, self._find_person, output_dir,
+                self.semester_start, self.section_clock.bounds,
+                self.conf.get("calendar_free_ratio", 0.5) or 0.5,
+            )
+        except Exception as e:
+            logger.error(f"导出日历失败: {e}")
+            return f"❌ 导出日历失败: {str(e)}"
+        
+        info = f"📅 已导出日历: {os.path.abspath(output_dir)}\n"
+        info += f"👥 干事日历: 更新 {stats['written']} 个，未变化跳过 {stats['skipped']} 个 ({os.path.abspath(stats['member_dir'])})\n"
+        info += f"🆓 群组空闲日历: {'已更新' if stats['group_written'] else '未变化'} ({os.path.abspath(stats['group_path'])})"
+        return info
     
     def _find_or_create_data_file(self, data_file: str | None = None) -> str:
         """查找或创建数据文件（改为在同级schedule文件夹中）"""
@@ -159,7 +377,7 @@ class FreeMembersPlugin:
             
             logger.info(f"✅ 已创建示例数据文件: {os.path.abspath(file_path)}")
             logger.info(f"📁 文件位置: {file_path}")
-            logger.info(f"👥 示例干事: 王闯、王雅馨、杨彦萍、姜元皓、石浩霖")
+            logger.info(f"👥 示例干事: {'、'.join(SAMPLE_MEMBER_NAMES)}")
             logger.info("💡 请用真实的课表数据替换此文件")
             
             return file_path
@@ -170,6 +388,14 @@ class FreeMembersPlugin:
             fallback_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "all_schedules.json")
             return fallback_path
     
+    def _is_sample_data(self, records: List[Dict]) -> bool:
+        """是否为 _create_sample_data_file 自动创建、尚未替换的示例数据"""
+        sample_table = self._create_sample_schedule()
+        return (
+            [person.get("name") for person in records] == list(SAMPLE_MEMBER_NAMES)
+            and all(person.get("table") == sample_table for person in records)
+        )
+    
     def _create_sample_schedule(self):
         """创建示例课表数据结构（11节×7天×20周）"""
         # 创建空的课表（全部无课）
@@ -204,8 +430,8 @@ class FreeMembersPlugin:
                 logger.info(f"📁 数据文件: {os.path.abspath(self.data_file)}")
                 
                 # 显示干事名单
-                names = [person.get('name', '未知') for person in data]
-                logger.info(f"👥 干事名单: {', '.join(names)}")
+                names = [str(person.get('name', '未知')) for person in data]
+                logger.info(f"👥 干事名单: {summarize_names(names, 20)}")
                 
                 return data
                 
@@ -228,11 +454,11 @@ class FreeMembersPlugin:
         
         return members
     
-    def get_current_week(self) -> int:
-        """获取当前周次"""
+    def get_current_week(self, day: Optional[date] = None) -> int:
+        """获取当前周次（可指定日期）"""
         try:
-            semester_start = datetime(2024, 9, 2)
-            today = datetime.now()
+            semester_start = datetime.combine(self.semester_start, datetime.min.time())
+            today = datetime.combine(day, datetime.min.time()) if day else datetime.now()
             delta = today - semester_start
             current_week = delta.days // 7 + 1
             return max(1, min(20, current_week))
@@ -247,11 +473,10 @@ class FreeMembersPlugin:
         if not name or not isinstance(name, str):
             return False
         
-        person_data = None
-        for person in self.schedule_data:
-            if person.get("name") == name:
-                person_data = person
-                break
+        if self.store:
+            return self.store.is_member_free(name, weekday, periods, week)
+        
+        person_data = self._find_person(name)
         
         if not person_data or "table" not in person_data:
             return False
@@ -274,10 +499,34 @@ class FreeMembersPlugin:
         
         return True
     
+    def _find_person(self, name: str) -> Optional[Dict]:
+        """按姓名查找课表记录（同名以第一条为准），索引随 schedule_data 更换自动重建"""
+        if self.store:
+            return self.store.get_member(name)
+        if self._person_index_source is not self.schedule_data:
+            self._person_index = {}
+            for person in self.schedule_data:
+                self._person_index.setdefault(person.get("name"), person)
+            self._person_index_source = self.schedule_data
+        return self._person_index.get(name)
+    
+    def filter_free_members(self, candidates: List[str], weekday: int, periods: List[int], week: int) -> List[str]:
+        """只在 candidates 中筛选指定时间段无课的干事（用于追问时的增量计算）"""
+        if self.sharded or self.store:
+            free_set = set(self.get_free_members_by_time(weekday, periods, week))
+            return [name for name in candidates if name in free_set]
+        return [name for name in candidates if self.is_member_free(name, weekday, periods, week)]
+    
     def get_free_members_by_time(self, weekday: int, periods: List[int], week: int = 0) -> List[str]:
         """获取在指定时间段无课的所有干事"""
         if week == 0:
             week = self.get_current_week()
+        
+        if self.sharded:
+            return self.sharded.get_free_members(weekday, periods, week)
+        
+        if self.store:
+            return self.store.get_free_members(weekday, periods, week)
             
         free_members = []
         for name in self.all_members:
@@ -285,6 +534,15 @@ class FreeMembersPlugin:
                 free_members.append(name)
         return free_members
     
+    def count_free_members(self, weekday: int, periods: List[int], week: int = 0) -> int:
+        """统计指定时间段无课人数（分片后端只汇总人数，不回传名单）"""
+        if week == 0:
+            week = self.get_current_week()
+        
+        if self.sharded:
+            return self.sharded.count_free_members(weekday, periods, [week])[0]
+        return len(self.get_free_members_by_time(weekday, periods, week))
+    
     def parse_time_range(self, time_description: str) -> Dict:
         """解析时间段描述"""
         if not time_description or not isinstance(time_description, str):
@@ -301,6 +559,11 @@ class FreeMembersPlugin:
             "periods": time_info.get("sections", []),
         }
         
+        # “明天下午” 等相对日期（未写明星期时）按实际日期确定星期
+        day = self._relative_day(time_description)
+        if day and not re.search(r"(?:星期|礼拜|周)[一二三四五六日天]", time_description):
+            result["weekday"] = day.weekday() + 1
+        
         if not result["periods"]:
             if "上午" in time_description or "早" in time_description:
                 result["periods"] = [1, 2, 3, 4]
@@ -313,10 +576,16 @@ class FreeMembersPlugin:
         
         return result
     
+    @staticmethod
+    def _relative_day(text: str) -> Optional[date]:
+        """“今天 / 明天 / 后天” 对应的日期，未提及返回 None"""
+        offset = relative_day_offset(text or "")
+        return date.today() + timedelta(days=offset) if offset is not None else None
+    
     def find_free_members(self, time_description: str, week: int = 0) -> Dict:
         """一键查找无课干事"""
         if week == 0:
-            week = self.get_current_week()
+            week = self.get_current_week(self._relative_day(time_description))
             
         default_result = {
             "time_description": time_description or "未知时间",
@@ -326,107 +595,176 @@ class FreeMembersPlugin:
             "free_count": 0, "total_count": 0, "free_percentage": 0.0
         }
         
-        if not self.schedule_data:
+        if not self.member_count():
             default_result["error"] = "无课表数据"
             return default_result
         
         try:
             time_info = self.parse_time_range(time_description)
-            weekday = time_info["weekday"]
-            periods = time_info["periods"]
-            
-            free_members = self.get_free_members_by_time(weekday, periods, week)
-            busy_members = [name for name in self.all_members if name not in free_members]
-            
-            weekday_names = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
-            weekday_str = weekday_names[weekday-1] if 1 <= weekday <= 7 else f"周{weekday}"
-            periods_str = "、".join([f"第{period}节" for period in periods])
-            
-            total_count = len(self.all_members)
-            free_count = len(free_members)
-            free_percentage = round(free_count / total_count * 100, 1) if total_count > 0 else 0
-            
-            return {
-                "time_description": time_description,
-                "weekday": weekday, "weekday_str": weekday_str,
-                "periods": periods, "periods_str": periods_str,
-                "week": week, "free_members": free_members,
-                "busy_members": busy_members, "free_count": free_count,
-                "total_count": total_count, "free_percentage": free_percentage
-            }
-            
+            return self._build_result(time_description, time_info["weekday"], time_info["periods"], week)
         except Exception as e:
             logger.error(f"查询失败: {e}")
             default_result["error"] = f"查询失败: {str(e)}"
             return default_result
-    
-    def format_result(self, result: Dict) -> str:
-        """格式化查询结果为可读字符串"""
-        if "error" in result:
-            return f"❌ {result.get('error', '未知错误')}"
-        
-        time_description = result.get("time_description", "未知时间")
-        weekday_str = result.get("weekday_str", "未知星期")
-        periods_str = result.get("periods_str", "未知节次")
-        week = result.get("week", 1)
-        total_count = result.get("total_count", 0)
-        free_count = result.get("free_count", 0)
-        free_percentage = result.get("free_percentage", 0.0)
-        free_members = result.get("free_members", [])
-        busy_members = result.get("busy_members", [])
-        
-        output = []
-        output.append(f"📊 无课干事查询结果")
-        output.append(f"⏰ 时间: {weekday_str} {periods_str} (第{week}周)")
-        output.append(f"👥 总人数: {total_count}人")
-        output.append(f"🆓 无课人数: {free_count}人 ({free_percentage}%)")
-        output.append("")
-        
-        if free_members:
-            output.append("✅ 无课干事:")
-            free_list = "、".join(free_members)
-            output.append(f"   {free_list}")
-        else:
-            output.append("❌ 该时间段无人无课")
+
+    def find_free_members_at(self, weekday: int, periods: List[int], week: int = 0,
+                             time_description: str = "") -> Dict:
+        """按已确定的星期和节次查询无课干事（实时查询，结果按分钟缓存）"""
+        if week == 0:
+            week = self.get_current_week()
+
+        stamp = datetime.now().strftime("%Y%m%d%H%M")
+        if stamp != self._minute_cache_stamp:
+            self._minute_cache_stamp = stamp
+            self._minute_cache = {}
+
+        key = (weekday, tuple(periods), week)
+        cached = self._minute_cache.get(key)
+        if cached is None:
+            cached = self._build_result(time_description, weekday, periods, week)
+            self._minute_cache[key] = cached
+        return dict(cached, time_description=time_description or cached["time_description"])
+
+    def _build_result(self, time_description: str, weekday: int, periods: List[int], week: int,
+                      free_members: Optional[List[str]] = None) -> Dict:
+        """根据星期、节次和周次计算查询结果（可传入已算好的无课名单）"""
+        if free_members is None:
+            free_members = self.get_free_members_by_time(weekday, periods, week)
+        free_set = set(free_members)
+        busy_members = [name for name in self.all_members if name not in free_set]
         
-        if busy_members:
-            output.append("")
-            output.append("📚 有课干事:")
-            busy_list = "、".join(busy_members)
-            output.append(f"   {busy_list}")
+        weekday_names = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+        weekday_str = weekday_names[weekday-1] if 1 <= weekday <= 7 else f"周{weekday}"
+        periods_str = "、".join([f"第{period}节" for period in periods])
         
-        return "\n".join(output)
+        total_count = len(self.all_members)
+        free_count = len(free_members)
+        free_percentage = round(free_count / total_count * 100, 1) if total_count > 0 else 0
+        
+        return {
+            "time_description": time_description,
+            "weekday": weekday, "weekday_str": weekday_str,
+            "periods": periods, "periods_str": periods_str,
+            "week": week, "free_members": free_members,
+            "busy_members": busy_members, "free_count": free_count,
+            "total_count": total_count, "free_percentage": free_percentage,
+            "generation": self.data_generation
+        }
+    
+    def refine_free_members(self, previous: Dict, weekday: int, periods: List[int], week: int,
+                            time_description: str = "") -> Dict:
+        """
+        在上一次查询结果的基础上计算新查询：
+        同一天同一周且只追加节次时，只需在上次的无课名单中筛选新增节次，不再全量扫描
+        """
+        reusable = (
+            previous.get("generation") == self.data_generation
+            and previous.get("weekday") == weekday and previous.get("week") == week
+            and set(previous.get("periods", [])).issubset(periods)
+        )
+        if not reusable:
+            return self.find_free_members_at(weekday, periods, week, time_description)
+        
+        extra = [period for period in periods if period not in previous["periods"]]
+        free_members = previous["free_members"]
+        if extra:
+            free_members = self.filter_free_members(free_members, weekday, extra, week)
+        return self._build_result(time_description, weekday, periods, week, free_members)
+    
+    def format_result(self, result: Dict, template: str = "") -> str:
+        """格式化查询结果为可读字符串（多页之间以 PAGE_BREAK 分隔）"""
+        pages = self.renderer.render(result, template or self.reply_template, self._class_counts)
+        return PAGE_BREAK.join(pages)
+    
+    def _class_counts(self, names: List[str]) -> Dict[str, int]:
+        """按班级统计人数（用于按班级汇总；SQLite 后端一次查询完成）"""
+        if self.store:
+            return self.store.count_by_class(names)
+        counts: Dict[str, int] = {}
+        for name in names:
+            person = self._find_person(name)
+            class_name = (person.get("class_name") or "") if person else ""
+            counts[class_name] = counts.get(class_name, 0) + 1
+        return counts
     
-    def quick_call_free_members(self, time_description: str, week: int = 0) -> str:
+    def quick_call_free_members(self, time_description: str, week: int = 0,
+                                session_key: Optional[tuple] = None) -> str:
         """一键呼出无课干事"""
-        if week == 0:
-            week = self.get_current_week()
-            
         if not time_description or not isinstance(time_description, str):
             time_description = "今天"
         
-        if not self.schedule_data:
+        if not self.member_count():
             schedule_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schedule")
             file_path = os.path.join(schedule_dir, "all_schedules.json")
             return f"❌ 未找到课表数据\n💡 已自动创建示例文件，请用真实数据替换: {os.path.abspath(file_path)}"
         
         result = self.find_free_members(time_description, week)
+        if session_key and "error" not in result:
+            self.query_contexts.put(session_key, result)
+        return self.format_result(result)
+
+    def quick_call_free_members_at(self, weekday: int, periods: List[int], week: int = 0,
+                                   time_description: str = "", session_key: Optional[tuple] = None) -> str:
+        """按已确定的星期和节次呼出无课干事（实时查询）"""
+        if not self.member_count():
+            schedule_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schedule")
+            file_path = os.path.join(schedule_dir, "all_schedules.json")
+            return f"❌ 未找到课表数据\n💡 已自动创建示例文件，请用真实数据替换: {os.path.abspath(file_path)}"
+        
+        if not periods:
+            return f"🌙 {time_description or '该时间'}不在上课时间，全员无课 (共{len(self.all_members)}人)"
+        
+        try:
+            result = self.find_free_members_at(weekday, periods, week, time_description)
+        except Exception as e:
+            logger.error(f"查询失败: {e}")
+            return f"❌ 查询失败: {str(e)}"
+        if session_key:
+            self.query_contexts.put(session_key, result)
+        return self.format_result(result)
+    
+    def quick_call_follow_up(self, session_key: tuple, message: str) -> str:
+        """处理 “那下午呢”、“下周呢”、“再加上晚上” 等追问；不是追问或上下文已过期时返回空字符串"""
+        previous = self.query_contexts.get(session_key)
+        if not previous:
+            return ""
+        change = parse_follow_up(message)
+        if not change:
+            return ""
+        
+        weekday = change.get("weekday", previous["weekday"])
+        week = change.get("week", previous["week"] + change.get("week_offset", 0))
+        if "day_offset" in change:
+            # “那明天呢” 按实际日期换算星期和周次，不沿用上一次查询的周次
+            day = date.today() + timedelta(days=change["day_offset"])
+            weekday, week = day.weekday() + 1, self.get_current_week(day)
+        week = max(1, min(20, week))
+        periods = previous["periods"]
+        if "periods" in change:
+            periods = sorted(set(periods) | set(change["periods"])) if change["extend"] else change["periods"]
+        
+        try:
+            result = self.refine_free_members(previous, weekday, periods, week, message)
+        except Exception as e:
+            logger.error(f"查询失败: {e}")
+            return f"❌ 查询失败: {str(e)}"
+        self.query_contexts.put(session_key, result)
         return self.format_result(result)
 
 
 @register("check_classtable", "gbasamera", "识别课表，一键呼出无课干事", "1.0.0")
 class CheckClassTable(Star):
-    def __init__(self, context: Context):
+    def __init__(self, context: Context, config: AstrBotConfig):
         super().__init__(context)
-        self.plugin = FreeMembersPlugin(context, config = AstrBotConfig())    
+        self.plugin = FreeMembersPlugin(context, config=config)
     async def initialize(self):
         """插件初始化"""
         logger.info("✅ 课表查询插件已启动")
         
-        if self.plugin.schedule_data:
+        if self.plugin.member_count():
             members = self.plugin.all_members
             logger.info(f"✅ 成功加载 {len(members)} 个干事的课表")
-            logger.info(f"👥 干事名单: {', '.join(members)}")
+            logger.info(f"👥 干事名单: {summarize_names(members, 20)}")
             logger.info(f"📁 数据文件: {os.path.abspath(self.plugin.data_file)}")
         else:
             logger.warning("⚠️ 使用示例数据文件")
@@ -435,32 +773,39 @@ class CheckClassTable(Star):
             logger.info(f"💡 请用真实的课表数据替换: {os.path.abspath(file_path)}")
 
     @filter.event_message_type(EventMessageType.GROUP_MESSAGE)
-    async def handle_message(self, event: AstrMessageEvent) -> MessageEventResult:
-        """处理群消息"""
+    async def handle_message(self, event: AstrMessageEvent):
+        """处理群消息（长回复分多条消息发送）"""
         try:
             message = event.message_str.strip()
             if not message:
-                return MessageEventResult()
+                return
             
             logger.info(f"📨 收到消息: {message}")
             
-            response = self.process_query(message)
+            if event.is_admin():
+                response = self.process_admin_command(message)
+                if response:
+                    yield event.plain_result(response)
+                    return
+            
+            session_key = (event.get_group_id(), event.get_sender_id())
+            response = self.process_query(message, session_key)
             if response:
+                pages = response.split(PAGE_BREAK)
                 # 在回复中添加文件位置信息（如果是示例数据）
-                if not self.plugin.schedule_data or len(self.plugin.schedule_data) <= 5:  # 示例数据只有5个人
+                if self.plugin.member_count() <= 5:  # 示例数据只有5个人
                     schedule_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schedule")
                     file_path = os.path.join(schedule_dir, "all_schedules.json")
-                    response += f"\n\n💡 当前使用示例数据，文件位置: {os.path.abspath(file_path)}"
+                    pages[-1] += f"\n\n💡 当前使用示例数据，文件位置: {os.path.abspath(file_path)}"
                 
-                return event.plain_result(response)
+                for page in pages:
+                    yield event.plain_result(page)
             
         except Exception as e:
             logger.error(f"处理消息时出错: {e}")
-            return event.plain_result("❌ 查询失败，请稍后重试")
-        
-        return MessageEventResult()
+            yield event.plain_result("❌ 查询失败，请稍后重试")
     
-    def process_query(self, message: str) -> str:
+    def process_query(self, message: str, session_key: Optional[tuple] = None) -> str:
         """处理查询消息"""
         if not message or not isinstance(message, str):
             return ""
@@ -477,14 +822,52 @@ class CheckClassTable(Star):
         if any(keyword in message_lower for keyword in ["统计", "状态"]):
             return self.schedule_stats()
         
-        if any(keyword in message for keyword in ["无课", "没课", "空闲", "谁有空", "呼人"]):
+        # 追问（那下午呢 / 下周呢 / 再加上晚上）在上一次查询的基础上计算
+        if session_key:
+            response = self.plugin.quick_call_follow_up(session_key, message)
+            if response:
+                return response
+        
+        if any(keyword in message for keyword in QUERY_KEYWORDS):
+            realtime = self.resolve_realtime_query(message)
+            if realtime:
+                return self.plugin.quick_call_free_members_at(**realtime, session_key=session_key)
             time_desc = self.extract_time_from_message(message)
-            return self.quick_call(time_desc)
+            return self.quick_call(time_desc, session_key)
         
         time_keywords = ["今天", "明天", "后天", "周一", "周二", "周三", "周四", "周五", "周六", "周日", 
                         "上午", "下午", "晚上", "一二节", "三四节", "五六节", "七八节"]
         if any(keyword in message for keyword in time_keywords):
-            return self.quick_call(message)
+            return self.quick_call(message, session_key)
+        
+        return ""
+    
+    def process_admin_command(self, message: str) -> str:
+        """处理管理员命令（课表维护需 SQLite 后端）"""
+        if message.startswith("更新课表"):
+            payload = message[len("更新课表"):].strip()
+            try:
+                record = json.loads(payload)
+            except json.JSONDecodeError as e:
+                return f"❌ 课表 JSON 格式错误: {e}"
+            if not isinstance(record, dict) or not record.get("name") or "table" not in record:
+                return "❌ 课表需包含 name 和 table 字段"
+            return self.plugin.upsert_member(record)
+        
+        if message.startswith("删除干事"):
+            name = message[len("删除干事"):].strip()
+            if not name:
+                return "❌ 请提供要删除的干事姓名，如: 删除干事 王闯"
+            return self.plugin.delete_member(name)
+        
+        if message.startswith("导入课表"):
+            return self.plugin.import_json_to_store(message[len("导入课表"):].strip())
+        
+        if message.startswith("导出课表"):
+            return self.plugin.export_store_to_json(message[len("导出课表"):].strip())
+        
+        if message.startswith("导出日历"):
+            return self.plugin.export_calendars()
         
         return ""
     
@@ -493,7 +876,7 @@ class CheckClassTable(Star):
         file_path = self.plugin.data_file
         abs_path = os.path.abspath(file_path)
         exists = os.path.exists(file_path)
-        data_count = len(self.plugin.schedule_data)
+        data_count = self.plugin.member_count()
         
         info = f"📁 数据文件信息:\n"
         info += f"📍 路径: {abs_path}\n"
@@ -501,10 +884,7 @@ class CheckClassTable(Star):
         info += f"👥 数据: {data_count} 个干事\n"
         
         if data_count > 0:
-            members = self.plugin.all_members[:5]  # 显示前5个
-            info += f"📋 干事: {', '.join(members)}"
-            if data_count > 5:
-                info += f" 等{data_count}人"
+            info += f"📋 干事: {summarize_names(self.plugin.all_members, 5)}"
         
         if data_count <= 5:  # 可能是示例数据
             schedule_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schedule")
@@ -514,43 +894,76 @@ class CheckClassTable(Star):
         return info
     
     def extract_time_from_message(self, message: str) -> str:
-        """从消息中提取时间描述"""
+        """从消息中提取时间描述（含时间词时保留整句，“明天下午” 等组合才能同时生效）"""
         if not message or not isinstance(message, str):
             return "今天"
         
         time_keywords = ["今天", "明天", "后天", "周一", "周二", "周三", "周四", "周五", "周六", "周日", 
                         "上午", "下午", "晚上", "一二节", "三四节", "五六节", "七八节"]
         
-        for keyword in time_keywords:
-            if keyword in message:
-                return keyword
+        if any(keyword in message for keyword in time_keywords):
+            return message
         
+        return "今天"
+    
+    def resolve_realtime_query(self, message: str) -> Optional[Dict]:
+        """
+        解析 “现在谁有空”、“三点半谁有空”、“接下来一小时谁没课” 等按时刻的查询，
+        通过作息时间预计算表直接定位节次；不属于此类查询时返回 None
+        """
         now = datetime.now()
-        current_weekday = now.weekday() + 1
+        clock = self.plugin.section_clock
         
-        if current_weekday <= 5:
-            current_hour = now.hour
-            if 8 <= current_hour < 12:
-                return "今天上午"
-            elif 14 <= current_hour < 18:
-                return "今天下午"
+        duration = parse_duration_minutes(message)
+        if duration:
+            periods = clock.sections_within(now.hour, now.minute, duration)
+            return {
+                "weekday": now.weekday() + 1, "periods": periods,
+                "week": self.plugin.get_current_week(),
+                "time_description": f"接下来{duration}分钟",
+            }
         
-        return "今天"
+        point = parse_clock_phrase(message)
+        if point:
+            hour, minute, period = point
+            # 课表语境下不带上下午的 “三点” 通常指下午；写明 “早上六点” 时不推测
+            if period is None and hour < 7:
+                hour += 12
+            info = parse_natural_datetime(message, now)
+            section = clock.section_from(hour, minute)
+            return {
+                "weekday": info["weekday"] + 1, "periods": [section] if section else [],
+                "week": self.plugin.get_current_week(info["date"]),
+                "time_description": f"{hour:02d}:{minute:02d}",
+            }
+        
+        time_keywords = ["今天", "明天", "后天", "周一", "周二", "周三", "周四", "周五", "周六", "周日", 
+                        "上午", "下午", "晚上", "一二节", "三四节", "五六节", "七八节"]
+        if any(keyword in message for keyword in ["现在", "当前", "此刻"]) or \
+                not any(keyword in message for keyword in time_keywords):
+            section = clock.section_from(now.hour, now.minute)
+            return {
+                "weekday": now.weekday() + 1, "periods": [section] if section else [],
+                "week": self.plugin.get_current_week(),
+                "time_description": "现在",
+            }
+        
+        return None
     
-    def quick_call(self, time_desc: str = "今天") -> str:
+    def quick_call(self, time_desc: str = "今天", session_key: Optional[tuple] = None) -> str:
         """一键呼出无课干事"""
         if not time_desc or not isinstance(time_desc, str):
             time_desc = "今天"
         
         try:
-            return self.plugin.quick_call_free_members(time_desc)
+            return self.plugin.quick_call_free_members(time_desc, session_key=session_key)
         except Exception as e:
             logger.error(f"查询失败: {e}")
             return f"❌ 查询失败: {str(e)}"
     
     def schedule_stats(self) -> str:
         """课表统计信息"""
-        if not self.plugin.schedule_data:
+        if not self.plugin.member_count():
             schedule_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schedule")
             file_path = os.path.join(schedule_dir, "all_schedules.json")
             return f"❌ 未找到课表数据\n💡 已自动创建示例文件，请用真实数据替换: {os.path.abspath(file_path)}"
@@ -568,8 +981,8 @@ class CheckClassTable(Star):
             for slot in time_slots:
                 free_counts = []
                 for weekday in range(1, 6):
-                    result = self.plugin.find_free_members(f"{weekday_names[weekday-1]}{slot}")
-                    free_counts.append(result["free_count"])
+                    time_info = self.plugin.parse_time_range(f"{weekday_names[weekday-1]}{slot}")
+                    free_counts.append(self.plugin.count_free_members(time_info["weekday"], time_info["periods"]))
                 
                 avg_free = sum(free_counts) / len(free_counts) if free_counts else 0
                 avg_percentage = round(avg_free / total * 100, 1)
@@ -590,7 +1003,10 @@ class CheckClassTable(Star):
 🔍 查询命令：
 • "周二上午无课" - 查询周二上午无课干事
 • "谁周三下午有空" - 查询周三下午空闲人员
-• "一键呼人" - 自动查询当前时间段
+• "一键呼人" / "现在谁有空" - 按作息时间查询当前节次
+• "三点半谁有空" - 查询指定时刻所在节次
+• "接下来一小时谁没课" - 查询接下来一段时间内的节次
+• "那下午呢" / "下周呢" / "再加上晚上" - 在上一次查询的基础上追问
 • "课表统计" - 查看整体统计信息
 • "文件位置" - 查看数据文件信息
 
@@ -599,6 +1015,13 @@ class CheckClassTable(Star):
 • 周一至周日 + 时间段
 • 具体节次：一二节、三四节等
 
+🛠️ 管理员命令（课表维护需启用 SQLite 存储）：
+• "更新课表 {JSON}" - 新增或更新单个干事课表
+• "删除干事 姓名" - 删除单个干事
+• "导入课表 [文件名]" - 从 schedule 文件夹内的 JSON 文件整体导入
+• "导出课表 [文件名]" - 导出为 schedule 文件夹内的 JSON 文件
+• "导出日历" - 导出干事课表和群组空闲时间的 .ics 日历
+
 💡 示例：
 • "周二上午谁没课"
 • "明天下午呼人" 
@@ -612,4 +1035,5 @@ class CheckClassTable(Star):
 
     async def terminate(self):
         """插件卸载"""
+        self.plugin.close()
         logger.info("课表查询插件已卸载")
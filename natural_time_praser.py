@@ -96,6 +96,23 @@ WEEKDAY_MAP = {
     }
 
 
+RELATIVE_DAY_OFFSETS = {
+    "前天": -2,
+    "昨天": -1,
+    "今天": 0,
+    "明天": 1,
+    "后天": 2,
+}
+
+
+def relative_day_offset(text: str):
+    """“今天 / 明天 / 后天” 等相对日期的天数偏移，未提及返回 None"""
+    for word, offset in RELATIVE_DAY_OFFSETS.items():
+        if word in text:
+            return offset
+    return None
+
+
 # ============================================
 # 五、核心解析函数
 # ============================================
@@ -117,24 +134,14 @@ def parse_natural_time(text: str, base_date: datetime):
     # --------------------
     # 1️⃣ 日期偏移解析
     # --------------------
-    day_offset = 0
-    if "前天" in text:
-        day_offset = -2
-    elif "昨天" in text:
-        day_offset = -1
-    elif "今天" in text:
-        day_offset = 0
-    elif "明天" in text:
-        day_offset = 1
-    elif "后天" in text:
-        day_offset = 2
+    day_offset = relative_day_offset(text) or 0
 
     date = base_date + timedelta(days=day_offset)
 
     # --------------------
     # 2️⃣ 星期解析
     # --------------------
-    week_match = re.search(r"([上下本]?周)([一二三四五六日天])", text)
+    week_match = re.search(r"([上下本]?(?:周|星期|礼拜))([一二三四五六日天])", text)
     if week_match:
         prefix, day_ch = week_match.groups()
         weekday = WEEKDAY_MAP[day_ch]
@@ -176,20 +183,127 @@ def parse_natural_time(text: str, base_date: datetime):
     # --------------------
     # 5️⃣ 具体几点几分解析
     # --------------------
-    match = re.search(r"([早上上午中午下午傍晚晚上]?)([一二三四五六七八九十\d]+)点(半)?", text)
-    if match:
-        period, hour_str, half = match.groups()
-        hour = chinese_to_digit(hour_str)
-        if period in ("下午", "晚上") and hour < 12:
-            hour += 12
-        minute = 30 if half else 0
-        result["time_range"] = ((hour, minute), (hour, minute))
+    clock = parse_clock_time(text)
+    if clock:
+        result["time_range"] = (clock, clock)
 
     return result
 
 
+CLOCK_PERIOD_WORDS = ("早上", "上午", "中午", "下午", "傍晚", "晚上")
+
+
+def parse_clock_time(text: str):
+    """
+    解析 “下午三点”、“三点半”、“15点” 等具体时刻，返回 (小时, 分钟)，未匹配返回 None
+    """
+    clock = parse_clock_phrase(text)
+    return clock[:2] if clock else None
+
+
+def parse_clock_phrase(text: str):
+    """
+    与 parse_clock_time 相同，但返回 (小时, 分钟, 时段词)；
+    时段词为 “上午”、“下午” 等（未写明时为 None），调用方据此判断是否需要推测上下午
+    """
+    # 先去掉 “周三 / 星期五” 等星期，避免把 “周三三点” 的星期字读成小时；
+    # 小时前不能再有数字，避免把 “三十点” 读成十点
+    text = re.sub(r"(?:星期|礼拜|周)[一二三四五六日天]", " ", text)
+    match = re.search(
+        r"(" + "|".join(CLOCK_PERIOD_WORDS) + r")?(?<![零一二两三四五六七八九十\d])"
+        r"(二十[一二三]?|十[一二]?|[零一二两三四五六七八九]|\d{1,2})点(半)?",
+        text,
+    )
+    if not match:
+        return None
+    period, hour_str, half = match.groups()
+    hour = chinese_to_digit(hour_str.replace("两", "二"))
+    if hour > 23:
+        return None
+    if period in ("下午", "傍晚", "晚上") and hour < 12:
+        hour += 12
+    elif period == "中午" and hour < 5:  # 中午一点
+        hour += 12
+    minute = 30 if half else 0
+    return (hour, minute, period)
+
+
+def parse_duration_minutes(text: str):
+    """
+    解析 “接下来一小时”、“接下来两个小时”、“接下来30分钟” 等时长，返回分钟数，未匹配返回 None
+    """
+    match = re.search(r"接下来([一二两三四五六七八九十\d]+|半)(个)?(小时|钟头|分钟)", text)
+    if not match:
+        return None
+    amount_str, _, unit = match.groups()
+    if amount_str == "半":
+        return 30
+    amount = chinese_to_digit(amount_str.replace("两", "二"))
+    return amount if unit == "分钟" else amount * 60
+
+
 # ============================================
-# 六、测试代码（独立运行时使用）
+# 六、分钟 → 节次 预计算表
+# ============================================
+MINUTES_PER_DAY = 24 * 60
+
+
+class SectionClock:
+    """
+    根据作息时间（SECTION_TIME_MAP）预先计算一天中每一分钟对应的节次，
+    查询时只需按分钟下标取值。
+    - current[m]：第 m 分钟正在上的节次（课间为 0）
+    - upcoming[m]：第 m 分钟正在上或即将开始的节次（当天已无课为 0）
+    """
+
+    def __init__(self, section_time_map: dict = SECTION_TIME_MAP):
+        self.current = [0] * MINUTES_PER_DAY
+        self.upcoming = [0] * MINUTES_PER_DAY
+        self.bounds = {}  # 节次 : (开始分钟, 结束分钟)
+
+        for (first, last), ((h1, m1), (h2, m2)) in section_time_map.items():
+            start, end = h1 * 60 + m1, h2 * 60 + m2
+            count = last - first + 1
+            # 大节内按时长平均分配到每一小节
+            span = (end - start) / count
+            for i in range(count):
+                s = start + round(i * span)
+                e = start + round((i + 1) * span)
+                self.bounds[first + i] = (s, e)
+                for minute in range(s, min(e, MINUTES_PER_DAY)):
+                    self.current[minute] = first + i
+
+        nearest = 0
+        for minute in range(MINUTES_PER_DAY - 1, -1, -1):
+            if self.current[minute]:
+                nearest = self.current[minute]
+            self.upcoming[minute] = nearest
+
+    @staticmethod
+    def to_minute(hour: int, minute: int = 0) -> int:
+        """将时刻转换为当天的分钟下标"""
+        return max(0, min(MINUTES_PER_DAY - 1, hour * 60 + minute))
+
+    def section_at(self, hour: int, minute: int = 0) -> int:
+        """指定时刻正在上的节次，课间返回 0"""
+        return self.current[self.to_minute(hour, minute)]
+
+    def section_from(self, hour: int, minute: int = 0) -> int:
+        """指定时刻正在上或接下来最近的一节，当天已无课返回 0"""
+        return self.upcoming[self.to_minute(hour, minute)]
+
+    def sections_within(self, hour: int, minute: int, duration: int) -> list:
+        """从指定时刻起 duration 分钟内涉及的所有节次"""
+        start = self.to_minute(hour, minute)
+        end = start + max(duration, 1)
+        return sorted(
+            section for section, (s, e) in self.bounds.items()
+            if s < end and e > start
+        )
+
+
+# ============================================
+# 七、测试代码（独立运行时使用）
 # ============================================
 if __name__ == "__main__":
     examples = [
@@ -201,4 +315,10 @@ if __name__ == "__main__":
         "后天晚上",
     ]
     for e in examples:
-        print(f"{e} → {parse_natural_time(e, datetime.now())}\n")
\ No newline at end of file
+        print(f"{e} → {parse_natural_time(e, datetime.now())}\n")
+
+    clock = SectionClock()
+    for h, m in [(8, 30), (12, 30), (15, 30), (22, 0)]:
+        print(f"{h:02d}:{m:02d} → 当前第{clock.section_at(h, m)}节, "
+              f"最近第{clock.section_from(h, m)}节, "
+              f"一小时内 {clock.sections_within(h, m, 60)}")
\ No newline at end of file
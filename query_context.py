@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+query_context.py
+-----------------------------------
+连续追问的查询上下文
+
+功能：
+- 按 (群, 用户) 保存最近一次查询结果，带过期时间和容量上限（超出时淘汰最久未用的）。
+- 识别 “那下午呢”、“下周呢”、“再加上晚上”、“周四呢”、“那明天呢” 等不完整的追问，
+  解析出需要变化的维度（节次 / 星期 / 周次 / 相对日期），与上一次查询合并。
+- 带有 “谁有空”、“无课” 等查询词的完整问题（如 “明天下午谁有空呢”）不当作追问。
+"""
+
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+from .natural_time_praser import SECTION_NAME_MAP, WEEKDAY_MAP, chinese_to_digit, relative_day_offset
+
+
+# ============================================
+# 一、上下文存储
+# ============================================
+class QueryContextStore:
+    """带 TTL 和容量上限的查询上下文（LRU）"""
+
+    def __init__(self, ttl: float = 300, max_size: int = 512):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._items: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Dict]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Dict):
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+
+# ============================================
+# 二、追问解析
+# ============================================
+QUERY_KEYWORDS = ("无课", "没课", "空闲", "谁有空", "呼人")
+FOLLOW_UP_MARKERS = ("那", "呢", "再加", "加上", "换成", "改成")
+EXTEND_MARKERS = ("再加", "加上", "还有")
+
+PERIOD_PHRASES = {
+    "上午": [1, 2, 3, 4],
+    "早上": [1, 2, 3, 4],
+    "下午": [5, 6, 7, 8],
+    "晚上": [9, 10, 11],
+}
+
+
+def parse_follow_up(message: str) -> Optional[Dict]:
+    """
+    解析追问，返回变化的维度：
+        {
+            "extend": bool,         # True 表示在原节次上追加（再加上晚上）
+            "periods": [...],       # 新节次（未提及则无此键）
+            "weekday": int,         # 新星期 1-7（未提及则无此键）
+            "week_offset": int,     # 相对周次偏移（下周 +1 / 上周 -1）
+            "week": int,            # 指定周次（第N周）
+            "day_offset": int,      # 今天 0 / 明天 1 / 后天 2，由调用方换算为星期和周次，覆盖上下文
+        }
+    不是追问（含查询词的完整问题也不算）或没有任何可识别的时间变化时返回 None
+    """
+    message = message.strip()
+    if not any(marker in message for marker in FOLLOW_UP_MARKERS):
+        return None
+    if any(keyword in message for keyword in QUERY_KEYWORDS):
+        return None
+
+    change: Dict = {"extend": any(marker in message for marker in EXTEND_MARKERS)}
+
+    periods = []
+    for name, sections in SECTION_NAME_MAP.items():
+        if name in message:
+            periods += [section for section in sections if section not in periods]
+    for phrase, sections in PERIOD_PHRASES.items():
+        if phrase in message:
+            periods += [section for section in sections if section not in periods]
+    if periods:
+        change["periods"] = sorted(periods)
+
+    day_offset = relative_day_offset(message)
+    weekday_match = re.search(r"(?:星期|礼拜|周)([一二三四五六日天])", message)
+    if day_offset is not None:
+        change["day_offset"] = day_offset
+    elif weekday_match:
+        change["weekday"] = WEEKDAY_MAP[weekday_match.group(1)] + 1
+
+    week_match = re.search(r"第([一二三四五六七八九十\d]+)周", message)
+    if week_match:
+        change["week"] = chinese_to_digit(week_match.group(1))
+    elif "下周" in message:
+        change["week_offset"] = 1
+    elif "上周" in message:
+        change["week_offset"] = -1
+
+    if len(change) == 1:
+        return None
+    return change
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+reply_renderer.py
+-----------------------------------
+查询结果回复渲染模块
+
+功能：
+- 提供多种回复模板：
+    full      列出全部无课和有课干事
+    compact   列出无课干事，有课干事只显示人数
+    by_class  列出无课干事，有课干事按班级汇总人数
+- 按字数上限将回复分页为多条消息，名单逐行拼接，不会先拼出整份名单再截断。
+- 渲染结果按 (查询结果, 模板, 数据版本) 缓存，相同查询不重复拼接字符串。
+"""
+
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+
+# 分页回复在字符串中的分隔符（由消息处理函数拆分为多条消息发送）
+PAGE_BREAK = "\f"
+
+TEMPLATES = ("full", "compact", "by_class")
+
+
+def summarize_names(names: List[str], limit: int = 5, sep: str = ", ") -> str:
+    """只取前 limit 个姓名，超出部分显示为 “等N人”"""
+    shown = sep.join(names[:limit])
+    if len(names) > limit:
+        shown += f" 等{len(names)}人"
+    return shown
+
+
+def _name_lines(names: Iterable[str], width: int, indent: str = "   ") -> Iterator[str]:
+    """将姓名逐个排成不超过 width 字的行"""
+    line: List[str] = []
+    length = len(indent)
+    for name in names:
+        extra = len(name) + (1 if line else 0)
+        if line and length + extra > width:
+            yield indent + "、".join(line)
+            line, length = [], len(indent)
+            extra = len(name)
+        line.append(name)
+        length += extra
+    if line:
+        yield indent + "、".join(line)
+
+
+class ReplyRenderer:
+    """将 find_free_members 的结果渲染为一条或多条消息"""
+
+    def __init__(self, max_chars: int = 1500, line_width: int = 60, cache_size: int = 128):
+        self.max_chars = max(max_chars, 100)
+        self.line_width = min(line_width, self.max_chars)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, List[str]]" = OrderedDict()
+
+    @staticmethod
+    def _cache_key(result: Dict, template: str) -> tuple:
+        return (
+            result.get("weekday"), tuple(result.get("periods", [])), result.get("week"),
+            result.get("generation"), result.get("free_count"), template,
+        )
+
+    def render(self, result: Dict, template: str = "full",
+               group_counts: Optional[Callable[[List[str]], Dict[str, int]]] = None) -> List[str]:
+        """
+        渲染查询结果，返回分页后的消息列表；
+        group_counts 接收有课干事名单，一次性返回 {班级: 人数}（by_class 模板使用）
+        """
+        if "error" in result:
+            return [f"❌ {result.get('error', '未知错误')}"]
+        if template not in TEMPLATES:
+            template = "full"
+
+        key = self._cache_key(result, template)
+        pages = self._cache.get(key)
+        if pages is not None:
+            self._cache.move_to_end(key)
+            return pages
+
+        pages = self._paginate(self._lines(result, template, group_counts))
+        self._cache[key] = pages
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return pages
+
+    def clear(self):
+        self._cache.clear()
+
+    def _lines(self, result: Dict, template: str,
+               group_counts: Optional[Callable[[List[str]], Dict[str, int]]]) -> Iterator[str]:
+        free_members = result.get("free_members", [])
+        busy_members = result.get("busy_members", [])
+
+        yield "📊 无课干事查询结果"
+        yield f"⏰ 时间: {result.get('weekday_str', '未知星期')} {result.get('periods_str', '未知节次')} (第{result.get('week', 1)}周)"
+        yield f"👥 总人数: {result.get('total_count', 0)}人"
+        yield f"🆓 无课人数: {result.get('free_count', 0)}人 ({result.get('free_percentage', 0.0)}%)"
+        yield ""
+
+        if free_members:
+            yield "✅ 无课干事:"
+            yield from _name_lines(free_members, self.line_width)
+        else:
+            yield "❌ 该时间段无人无课"
+
+        if not busy_members:
+            return
+        yield ""
+        if template == "compact":
+            yield f"📚 有课干事: {len(busy_members)}人"
+        elif template == "by_class" and group_counts:
+            groups: Dict[str, int] = {}
+            for group, count in group_counts(busy_members).items():
+                group = group or "未分班"
+                groups[group] = groups.get(group, 0) + count
+            yield f"📚 有课干事: {len(busy_members)}人"
+            for group, count in sorted(groups.items(), key=lambda item: -item[1]):
+                yield f"   {group}: {count}人"
+        else:
+            yield "📚 有课干事:"
+            yield from _name_lines(busy_members, self.line_width)
+
+    def _paginate(self, lines: Iterable[str]) -> List[str]:
+        """按字数上限把行分配到多页，多页时在每页末尾标注页码"""
+        budget = self.max_chars - 12  # 预留页码标记
+        pages: List[List[str]] = [[]]
+        size = 0
+        for line in lines:
+            if pages[-1] and size + len(line) + 1 > budget:
+                pages.append([])
+                size = 0
+            pages[-1].append(line)
+            size += len(line) + 1
+
+        if len(pages) == 1:
+            return ["\n".join(pages[0])]
+        return [
+            "\n".join(page).strip("\n") + f"\n📄 ({index}/{len(pages)})"
+            for index, page in enumerate(pages, start=1)
+        ]
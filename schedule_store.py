@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+schedule_store.py
+-----------------------------------
+SQLite 课表存储模块
+
+功能：
+- 使用标准库 sqlite3 将课表保存在本地数据库文件中，替代整份 all_schedules.json 的读写。
+- 有课时段拆分为 busy_slots(name, week, weekday, period) 规范化表，
+  并按 (week, weekday, period) 建立索引，查询无需加载全部课表。
+- 支持按干事单独更新 / 删除（事务内完成），以及与现有 JSON 格式互相导入导出。
+- 开启 WAL 模式，查询与写入可以并发进行。
+- 每个存储对象只打开一个长连接（加锁后可跨线程使用），逐人查询时不重复建立连接。
+
+课表数据结构与 all_schedules.json 一致：
+    {
+        "name": "王闯", "semester": "...", "class_name": "...", "major": "...", "college": "...",
+        "table": [[[0/1 × 周数] × 7天] × 节数]
+    }
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+# ============================================
+# 一、表结构
+# ============================================
+MEMBER_FIELDS = ("semester", "class_name", "major", "college")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS members (
+    name       TEXT PRIMARY KEY,
+    position   INTEGER NOT NULL,
+    semester   TEXT,
+    class_name TEXT,
+    major      TEXT,
+    college    TEXT,
+    has_table  INTEGER NOT NULL DEFAULT 1,
+    periods    INTEGER NOT NULL DEFAULT 0,
+    weekdays   INTEGER NOT NULL DEFAULT 0,
+    weeks      INTEGER NOT NULL DEFAULT 0,
+    extra      TEXT
+);
+
+CREATE TABLE IF NOT EXISTS busy_slots (
+    name    TEXT NOT NULL REFERENCES members(name) ON DELETE CASCADE,
+    week    INTEGER NOT NULL,
+    weekday INTEGER NOT NULL,
+    period  INTEGER NOT NULL,
+    PRIMARY KEY (name, week, weekday, period)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_busy_slots_time ON busy_slots (week, weekday, period);
+"""
+
+
+# ============================================
+# 二、存储类
+# ============================================
+class ScheduleStore:
+    """基于 SQLite 的课表存储"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """独占长连接；with 块正常结束时提交，异常时回滚"""
+        with self._lock:
+            with self._conn:
+                yield self._conn
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+    # --------------------
+    # 1️⃣ 记录 ↔ 数据库行
+    # --------------------
+    @staticmethod
+    def _busy_rows(name: str, table: List) -> List[tuple]:
+        """将 11节×7天×20周 的课表展开为有课时段行"""
+        rows = []
+        for period_idx, days in enumerate(table):
+            for weekday_idx, weeks in enumerate(days):
+                for week_idx, flag in enumerate(weeks):
+                    if flag == 1:
+                        rows.append((name, week_idx + 1, weekday_idx + 1, period_idx + 1))
+        return rows
+
+    def _write_member(self, conn: sqlite3.Connection, record: Dict, position: Optional[int] = None):
+        """在当前事务中写入一个干事（已存在则覆盖，保留原有顺序）"""
+        name = str(record["name"])
+        table = record.get("table")
+        has_table = isinstance(table, list)
+        table = table if has_table else []
+
+        if position is None:
+            row = conn.execute("SELECT position FROM members WHERE name = ?", (name,)).fetchone()
+            if row:
+                position = row[0]
+            else:
+                position = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM members").fetchone()[0]
+
+        extra = {k: v for k, v in record.items() if k not in ("name", "table") + MEMBER_FIELDS}
+        conn.execute("DELETE FROM busy_slots WHERE name = ?", (name,))
+        conn.execute(
+            """
+            INSERT INTO members (name, position, semester, class_name, major, college,
+                                 has_table, periods, weekdays, weeks, extra)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                position = excluded.position, semester = excluded.semester,
+                class_name = excluded.class_name, major = excluded.major, college = excluded.college,
+                has_table = excluded.has_table, periods = excluded.periods,
+                weekdays = excluded.weekdays, weeks = excluded.weeks, extra = excluded.extra
+            """,
+            (
+                name, position, *(record.get(field) for field in MEMBER_FIELDS),
+                int(has_table), len(table),
+                max((len(days) for days in table), default=0),
+                max((len(weeks) for days in table for weeks in days), default=0),
+                json.dumps(extra, ensure_ascii=False) if extra else None,
+            ),
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO busy_slots (name, week, weekday, period) VALUES (?, ?, ?, ?)",
+            self._busy_rows(name, table),
+        )
+
+    def _read_member(self, conn: sqlite3.Connection, row: tuple) -> Dict:
+        """由 members 行和 busy_slots 还原 JSON 记录"""
+        name, semester, class_name, major, college, has_table, periods, weekdays, weeks, extra = row
+        record = {"name": name, "semester": semester, "class_name": class_name,
+                  "major": major, "college": college}
+        if extra:
+            record.update(json.loads(extra))
+        if has_table:
+            table = [[[0] * weeks for _ in range(weekdays)] for _ in range(periods)]
+            for week, weekday, period in conn.execute(
+                    "SELECT week, weekday, period FROM busy_slots WHERE name = ?", (name,)):
+                table[period - 1][weekday - 1][week - 1] = 1
+            record["table"] = table
+        return record
+
+    # --------------------
+    # 2️⃣ 单个干事增删
+    # --------------------
+    def upsert_member(self, record: Dict):
+        """新增或更新单个干事的课表（单事务）"""
+        if not record.get("name"):
+            raise ValueError("课表记录缺少 name 字段")
+        with self._connect() as conn:
+            self._write_member(conn, record)
+
+    def delete_member(self, name: str) -> bool:
+        """删除单个干事，返回是否存在该干事"""
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM members WHERE name = ?", (name,))
+            return cursor.rowcount > 0
+
+    # --------------------
+    # 3️⃣ 查询
+    # --------------------
+    def count_members(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM members").fetchone()[0]
+
+    def get_all_members(self) -> List[str]:
+        """按导入顺序返回所有干事姓名"""
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute("SELECT name FROM members ORDER BY position")]
+
+    def get_free_members(self, weekday: int, periods: List[int], week: int) -> List[str]:
+        """通过 (week, weekday, period) 索引查询指定时间段无课的干事"""
+        placeholders = ",".join("?" * len(periods)) or "NULL"
+        sql = f"""
+            SELECT name FROM members
+            WHERE has_table = 1 AND name NOT IN (
+                SELECT name FROM busy_slots
+                WHERE week = ? AND weekday = ? AND period IN ({placeholders})
+            )
+            ORDER BY position
+        """
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute(sql, (week, weekday, *periods))]
+
+    def is_member_free(self, name: str, weekday: int, periods: List[int], week: int) -> bool:
+        """判断单个干事在指定时间段是否无课"""
+        placeholders = ",".join("?" * len(periods)) or "NULL"
+        with self._connect() as conn:
+            row = conn.execute("SELECT has_table FROM members WHERE name = ?", (name,)).fetchone()
+            if not row or not row[0]:
+                return False
+            busy = conn.execute(
+                f"""
+                SELECT 1 FROM busy_slots
+                WHERE week = ? AND weekday = ? AND period IN ({placeholders}) AND name = ?
+                LIMIT 1
+                """,
+                (week, weekday, *periods, name),
+            ).fetchone()
+            return busy is None
+
+    def get_member(self, name: str) -> Optional[Dict]:
+        """读取单个干事的完整记录，不存在返回 None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                f"""
+                SELECT name, {", ".join(MEMBER_FIELDS)}, has_table, periods, weekdays, weeks, extra
+                FROM members WHERE name = ?
+                """,
+                (name,),
+            ).fetchone()
+            return self._read_member(conn, row) if row else None
+
+    def count_by_class(self, names: List[str]) -> Dict[str, int]:
+        """按班级统计给定干事的人数（分批查询），未分班或不在库中的计入空字符串"""
+        counts: Dict[str, int] = {}
+        with self._connect() as conn:
+            for start in range(0, len(names), 500):
+                chunk = names[start:start + 500]
+                rows = conn.execute(
+                    f"""
+                    SELECT COALESCE(class_name, ''), COUNT(*) FROM members
+                    WHERE name IN ({",".join("?" * len(chunk))}) GROUP BY 1
+                    """,
+                    chunk,
+                )
+                for class_name, count in rows:
+                    counts[class_name] = counts.get(class_name, 0) + count
+        missing = len(names) - sum(counts.values())
+        if missing > 0:
+            counts[""] = counts.get("", 0) + missing
+        return counts
+
+    def load_records(self) -> List[Dict]:
+        """读取全部课表，结构与 all_schedules.json 相同"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT name, {", ".join(MEMBER_FIELDS)}, has_table, periods, weekdays, weeks, extra
+                FROM members ORDER BY position
+                """
+            ).fetchall()
+            return [self._read_member(conn, row) for row in rows]
+
+    # --------------------
+    # 4️⃣ JSON 导入导出
+    # --------------------
+    def import_records(self, records: List[Dict]) -> int:
+        """用给定记录整体替换数据库内容（单事务），返回导入人数"""
+        seen = set()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM members")
+            for record in records:
+                name = record.get("name")
+                # 与 JSON 查询逻辑一致：重名时以第一条为准
+                if name is None or str(name) in seen:
+                    continue
+                seen.add(str(name))
+                self._write_member(conn, record, position=len(seen) - 1)
+        return len(seen)
+
+    def import_json(self, json_path: str) -> int:
+        """从 all_schedules.json 格式文件导入"""
+        with open(json_path, 'r', encoding='utf-8') as f:
+            return self.import_records(json.load(f))
+
+    def export_json(self, json_path: str) -> int:
+        """导出为 all_schedules.json 格式文件，返回导出人数"""
+        records = self.load_records()
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+        return len(records)
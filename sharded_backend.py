@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+sharded_backend.py
+-----------------------------------
+分片多进程查询后端（适用于数万人规模的名单）
+
+功能：
+- 将名单按顺序切分为若干分片，每个分片的课表压缩为节次位图，
+  存放在 multiprocessing.shared_memory 中，查询时各进程直接读取，无需复制数据。
+- 查询时把同一个请求分发到所有分片并行计算，再按原名单顺序合并结果，
+  与单进程的 get_free_members_by_time 结果完全一致。
+- 支持多周聚合统计（一次查询返回每一周的无课人数）。
+- 单个干事课表变更时原地改写其位图，名单人数或课表维度变化时才需要重建。
+- 进程池使用 forkserver（不支持时为 spawn）启动方式，不在多线程的宿主进程中直接 fork。
+
+共享内存布局（每个分片一块）：
+    valid:  count 字节，1 表示该干事有课表数据
+    masks:  按 (星期, 周次) 分槽、每槽 count 个 uint64，
+            第 p 位为 1 表示第 p+1 节有课
+    同一时间段的所有干事位图连续存放，查询只需顺序扫描一段内存。
+
+基准测试：
+    python sharded_backend.py [人数]
+"""
+
+import multiprocessing
+import os
+import sys
+import time
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+MASK_FORMAT = "Q"  # 每个 (干事, 星期, 周次) 一个 64 位节次位图
+MASK_SIZE = 8
+MAX_PERIODS = 64
+
+
+# ============================================
+# 一、工作进程侧
+# ============================================
+# 工作进程内已附加的共享内存：name -> (SharedMemory, valid 视图, masks 视图)
+_ATTACHED: Dict[str, Tuple] = {}
+
+
+def _attach(name: str, count: int):
+    if name not in _ATTACHED:
+        shm = shared_memory.SharedMemory(name=name)
+        valid = shm.buf[:count]
+        offset = _masks_offset(count)
+        masks = shm.buf[offset:].cast(MASK_FORMAT)
+        _ATTACHED[name] = (shm, valid, masks)
+    return _ATTACHED[name]
+
+
+def _masks_offset(count: int) -> int:
+    """valid 区按 8 字节对齐后即为位图区"""
+    return (count + MASK_SIZE - 1) // MASK_SIZE * MASK_SIZE
+
+
+def _scan_shard(name: str, count: int, days: int, weeks: int,
+                weekday: int, week_list: List[int], query_mask: int, collect: bool) -> List:
+    """
+    在单个分片内查询：对 week_list 中的每一周，
+    collect 为 True 时返回无课干事的分片内下标，否则只返回人数
+    """
+    _, valid, masks = _attach(name, count)
+    results = []
+    for week in week_list:
+        if 1 <= weekday <= days and 1 <= week <= weeks:
+            base = ((weekday - 1) * weeks + (week - 1)) * count
+            slot = masks[base:base + count]
+            free = [i for i, (ok, mask) in enumerate(zip(valid, slot)) if ok and not mask & query_mask]
+        else:
+            # 超出课表范围的星期 / 周次视为无课，与单进程逻辑一致
+            free = [i for i, ok in enumerate(valid) if ok]
+        results.append(free if collect else len(free))
+    return results
+
+
+# ============================================
+# 二、主进程侧
+# ============================================
+class ShardedScheduleBackend:
+    """分片共享内存 + 进程池的无课查询后端"""
+
+    def __init__(self, names: List[str], find_person: Callable[[str], Optional[Dict]],
+                 workers: Optional[int] = None):
+        """
+        names 为名单（顺序即结果顺序），find_person 按姓名返回课表记录（同名以第一条为准），
+        逐人读取，不要求调用方把全部课表放在内存中
+        """
+        self.names = list(names)
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.days, self.weeks = self._dimensions(self.names, find_person)
+        self.shards: List[Tuple[shared_memory.SharedMemory, int, int]] = []  # (共享内存, 起始下标, 人数)
+        self._positions: Dict[str, List[int]] = {}  # 姓名 -> 在名单中的下标（重名时有多个）
+        for index, name in enumerate(self.names):
+            self._positions.setdefault(name, []).append(index)
+
+        shard_count = min(self.workers, max(1, len(self.names)))
+        size = (len(self.names) + shard_count - 1) // shard_count
+        try:
+            for start in range(0, len(self.names), size or 1):
+                chunk = self.names[start:start + size]
+                self.shards.append((self._build_shard(chunk, find_person), start, len(chunk)))
+        except Exception:
+            self.close()
+            raise
+
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                        mp_context=multiprocessing.get_context(start_method))
+
+    @staticmethod
+    def _dimensions(names: List[str], find_person: Callable[[str], Optional[Dict]]) -> Tuple[int, int]:
+        days = weeks = 0
+        for name in dict.fromkeys(names):
+            person = find_person(name) if name else None
+            table = person.get("table") if person else None
+            if not isinstance(table, list):
+                continue
+            if len(table) > MAX_PERIODS:
+                raise ValueError(f"节次数超过 {MAX_PERIODS}，无法使用分片后端")
+            for row in table:
+                days = max(days, len(row))
+                for week_flags in row:
+                    weeks = max(weeks, len(week_flags))
+        return days, weeks
+
+    def _views(self, shm: shared_memory.SharedMemory, count: int):
+        offset = _masks_offset(count)
+        valid = shm.buf[:count]
+        masks = shm.buf[offset:offset + count * self.days * self.weeks * MASK_SIZE].cast(MASK_FORMAT)
+        return valid, masks
+
+    def _write_member(self, valid, masks, count: int, i: int, person: Optional[Dict], clear: bool = False):
+        """写入分片内第 i 个干事的位图（clear 为 True 时先清空原有数据）"""
+        if clear:
+            for slot in range(self.days * self.weeks):
+                masks[slot * count + i] = 0
+        if not person or "table" not in person:
+            valid[i] = 0
+            return
+        valid[i] = 1
+        for period_idx, row in enumerate(person["table"]):
+            bit = 1 << period_idx
+            for weekday_idx, week_flags in enumerate(row):
+                base = weekday_idx * self.weeks
+                for week_idx, flag in enumerate(week_flags):
+                    if flag == 1:
+                        masks[(base + week_idx) * count + i] |= bit
+
+    def _build_shard(self, names: List[str], find_person: Callable[[str], Optional[Dict]]) -> shared_memory.SharedMemory:
+        count = len(names)
+        shm = shared_memory.SharedMemory(
+            create=True, size=max(1, _masks_offset(count) + count * self.days * self.weeks * MASK_SIZE))
+        valid, masks = self._views(shm, count)
+        try:
+            for i, name in enumerate(names):
+                self._write_member(valid, masks, count, i, find_person(name) if name else None)
+        finally:
+            valid.release()
+            masks.release()
+        return shm
+
+    def update_member(self, name: str, person: Optional[Dict]) -> bool:
+        """
+        原地改写单个干事的位图（person 为 None 表示该干事已无课表）。
+        名单中没有该干事、或新课表超出现有节次 / 星期 / 周次维度时返回 False，需由调用方重建
+        """
+        positions = self._positions.get(name)
+        if not positions:
+            return False
+        table = person.get("table") if person else None
+        if isinstance(table, list) and (
+                len(table) > MAX_PERIODS
+                or any(len(row) > self.days or any(len(flags) > self.weeks for flags in row) for row in table)):
+            return False
+
+        starts = [start for _, start, _ in self.shards]
+        for position in positions:
+            shm, start, count = self.shards[bisect_right(starts, position) - 1]
+            valid, masks = self._views(shm, count)
+            try:
+                self._write_member(valid, masks, count, position - start, person, clear=True)
+            finally:
+                valid.release()
+                masks.release()
+        return True
+
+    @staticmethod
+    def _query_mask(periods: List[int]) -> int:
+        mask = 0
+        for period in periods:
+            if 1 <= period <= MAX_PERIODS:
+                mask |= 1 << (period - 1)
+        return mask
+
+    def _fan_out(self, weekday: int, periods: List[int], week_list: List[int], collect: bool) -> List:
+        query_mask = self._query_mask(periods)
+        futures = [
+            self.pool.submit(_scan_shard, shm.name, count, self.days, self.weeks,
+                             weekday, week_list, query_mask, collect)
+            for shm, _, count in self.shards
+        ]
+        return [future.result() for future in futures]
+
+    def get_free_members(self, weekday: int, periods: List[int], week: int) -> List[str]:
+        """查询指定时间段无课的干事，顺序与名单一致"""
+        free_members = []
+        for (_, start, _), (indices,) in zip(self.shards, self._fan_out(weekday, periods, [week], True)):
+            free_members.extend(self.names[start + i] for i in indices)
+        return free_members
+
+    def count_free_members(self, weekday: int, periods: List[int], week_list: List[int]) -> List[int]:
+        """多周聚合：返回 week_list 中每一周的无课人数"""
+        totals = [0] * len(week_list)
+        for counts in self._fan_out(weekday, periods, list(week_list), False):
+            for i, value in enumerate(counts):
+                totals[i] += value
+        return totals
+
+    def close(self):
+        """关闭进程池并释放共享内存"""
+        pool = getattr(self, "pool", None)
+        if pool:
+            pool.shutdown(wait=True)
+            self.pool = None
+        for shm, _, _ in self.shards:
+            shm.close()
+            shm.unlink()
+        self.shards = []
+
+
+# ============================================
+# 三、基准测试（独立运行时使用）
+# ============================================
+def _reference_free_members(names: List[str], records: List[Dict], weekday: int,
+                            periods: List[int], week: int) -> List[str]:
+    """单进程参考实现：FreeMembersPlugin.is_member_free 判定逻辑的独立副本（不导入插件本身）"""
+    by_name = {}
+    for person in records:
+        by_name.setdefault(person.get("name"), person)
+    free_members = []
+    for name in names:
+        person = by_name.get(name) if name else None
+        if not person or "table" not in person:
+            continue
+        schedule = person["table"]
+        busy = False
+        for period in periods:
+            p, d, w = period - 1, weekday - 1, week - 1
+            if (p < 0 or p >= len(schedule) or d < 0 or d >= len(schedule[p]) or
+                    w < 0 or w >= len(schedule[p][d])):
+                continue
+            if schedule[p][d][w] == 1:
+                busy = True
+                break
+        if not busy:
+            free_members.append(name)
+    return free_members
+
+
+if __name__ == "__main__":
+    import random
+
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 40000
+    random.seed(0)
+    records = [
+        {"name": f"干事{i}",
+         "table": [[[1 if random.random() < 0.3 else 0 for _ in range(20)] for _ in range(7)] for _ in range(11)]}
+        for i in range(total)
+    ]
+    names = [person["name"] for person in records]
+    queries = [(weekday, periods, week)
+               for weekday in range(1, 6)
+               for periods in ([1, 2], [3, 4], [5, 6], [7, 8], [9, 10, 11])
+               for week in (1, 8, 16)]
+
+    started = time.perf_counter()
+    expected = [_reference_free_members(names, records, *query) for query in queries]
+    single = time.perf_counter() - started
+    print(f"👥 {total} 人，{len(queries)} 次查询")
+    print(f"单进程参考实现: {single:.2f}s（is_member_free 判定逻辑的独立副本，并非直接调用插件）")
+    print("结果一致 = 与该参考实现逐条比对；加速比分别相对 1 个分片进程和单进程参考实现")
+
+    counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    baseline = None
+    for workers in counts:
+        by_name = {person["name"]: person for person in records}
+        backend = ShardedScheduleBackend(names, by_name.get, workers)
+        try:
+            backend.get_free_members(*queries[0])  # 预热进程池
+            started = time.perf_counter()
+            actual = [backend.get_free_members(*query) for query in queries]
+            elapsed = time.perf_counter() - started
+        finally:
+            backend.close()
+        assert actual == expected, "分片结果与单进程结果不一致"
+        baseline = baseline or elapsed
+        print(f"{workers:>2} 进程: {elapsed:.2f}s  相对 1 进程 {baseline / elapsed:.2f}x  "
+              f"相对单进程参考 {single / elapsed:.2f}x  ✅ 结果一致")
@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+"""
+timetable_importer.py
+-----------------------------------
+课表批量导入模块
+
+功能：
+- 读取目录中每位学生从教务系统导出的课表文件（CSV 或 HTML 表格页面），
+  转换为插件使用的 all_schedules.json 记录格式（table 为 11节×7天×20周）。
+- 解析 “1-16周(单)”、“1-16(单)周”、“1~16周”、“1-8,10-16周”、“2-16周(双)” 等周次写法并展开到周次维度；
+  单元格有内容但无法识别节次或周次时，该文件计入错误汇总。
+- 使用进程池并行处理，逐个文件输出进度，并汇总每个文件的错误信息。
+
+课表文件约定：
+- 表格首行为星期表头（星期一 / 周一 / Mon ...），首列为节次（第1节 / 1-2节 / 一二节 ...），
+  星期在首列、节次在首行的转置表格同样支持。
+- 单元格内为课程文字，需包含周次，如 “高等数学 1-16周(单) A101”；
+  单元格中若写明 “[3-4节]” 等节次则以单元格为准。
+- 姓名、班级等信息从表格前的 “姓名：张三” 一类文字中读取，未写明姓名时使用文件名。
+
+用法：
+    python timetable_importer.py 导出目录 [-o schedule/all_schedules.json] [-j 进程数]
+
+解析规则自检：
+    python -m doctest timetable_importer.py -v
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from .natural_time_praser import SECTION_NAME_MAP, WEEKDAY_MAP, chinese_to_digit
+except ImportError:  # 作为脚本直接运行
+    from natural_time_praser import SECTION_NAME_MAP, WEEKDAY_MAP, chinese_to_digit
+
+
+# ============================================
+# 一、常量
+# ============================================
+PERIOD_COUNT = 11
+WEEKDAY_COUNT = 7
+WEEK_COUNT = 20
+
+SUPPORTED_SUFFIXES = (".csv", ".html", ".htm")
+
+META_FIELDS = {
+    "姓名": "name",
+    "学期": "semester",
+    "班级": "class_name",
+    "专业": "major",
+    "学院": "college",
+}
+
+ENGLISH_WEEKDAYS = {"mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6}
+
+WEEK_RANGE_SEPARATOR = r"[-~～至]"
+WEEK_PATTERN = re.compile(
+    r"第?(\d+(?:\s*" + WEEK_RANGE_SEPARATOR + r"\s*\d+)?"
+    r"(?:\s*[,，、]\s*\d+(?:\s*" + WEEK_RANGE_SEPARATOR + r"\s*\d+)?)*)\s*"
+    r"(?:[(（\[]\s*(单|双)\s*[)）\]]|(单|双))?\s*周"
+    # 周后的单双标记须在括号内，或其后紧跟分隔符 / 单元格结尾，
+    # 避免把 “1-16周 双语课程”、“1-16周\n单片机原理” 中课程名的首字当作单双周
+    r"(?:[ \t]*[(（\[]\s*(单|双)\s*周?\s*[)）\]]|[ \t]*(单|双)周?(?=$|[\s,，;；、/]))?"
+)
+PERIOD_PATTERN = re.compile(r"第?\s*(\d+)\s*(?:[-~至]\s*(\d+)|((?:\s*[,，、]\s*\d+)+))?\s*节")
+
+
+# ============================================
+# 二、周次 / 节次 / 星期解析
+# ============================================
+def parse_week_range(text: str, max_weeks: int = WEEK_COUNT) -> List[int]:
+    """
+    将 “1-16周(单)”、“1-16(单)周”、“1~16周”、“1-8,10-16周”、“3周”、“2-16双周” 等写法展开为周次列表
+
+    >>> parse_week_range("1~16周") == list(range(1, 17))
+    True
+    >>> parse_week_range("1-8(单)周")
+    [1, 3, 5, 7]
+    >>> parse_week_range("2-8周 双")
+    [2, 4, 6, 8]
+    >>> parse_week_range("1-4周 双语课程")
+    [1, 2, 3, 4]
+    >>> parse_week_range("1-4周\\n单片机原理 5-6周")
+    [1, 2, 3, 4, 5, 6]
+    """
+    weeks = set()
+    for match in WEEK_PATTERN.finditer(text):
+        spec = match.group(1)
+        parity = match.group(2) or match.group(3) or match.group(4) or match.group(5)
+        for part in re.split(r"[,，、]", spec):
+            bounds = [int(x) for x in re.split(WEEK_RANGE_SEPARATOR, part) if x.strip()]
+            if not bounds:
+                continue
+            start, end = bounds[0], bounds[-1]
+            for week in range(start, end + 1):
+                if parity == "单" and week % 2 == 0:
+                    continue
+                if parity == "双" and week % 2 == 1:
+                    continue
+                if 1 <= week <= max_weeks:
+                    weeks.add(week)
+    return sorted(weeks)
+
+
+def parse_periods(text: str) -> List[int]:
+    """
+    将 “第1节”、“1-2节”、“01,02节”、“一二节”、“3” 等节次写法转换为节次列表
+    """
+    text = text.strip()
+    match = PERIOD_PATTERN.search(text)
+    if match:
+        first, last, rest = match.groups()
+        if last:
+            return list(range(int(first), int(last) + 1))
+        periods = [int(first)]
+        if rest:
+            periods += [int(x) for x in re.findall(r"\d+", rest)]
+        return periods
+
+    if text.isdigit():
+        return [int(text)]
+
+    for name, sections in SECTION_NAME_MAP.items():
+        if name in text:
+            return list(sections)
+
+    match = re.search(r"第([一二三四五六七八九十]+)节", text)
+    if match:
+        return [chinese_to_digit(match.group(1))]
+    return []
+
+
+def parse_weekday(text: str) -> Optional[int]:
+    """将 “星期一”、“周三”、“Mon” 等表头转换为 0-6，无法识别返回 None"""
+    text = text.strip()
+    match = re.search(r"(?:星期|周|礼拜)([一二三四五六日天])", text)
+    if match:
+        return WEEKDAY_MAP[match.group(1)]
+    return ENGLISH_WEEKDAYS.get(text[:3].lower())
+
+
+# ============================================
+# 三、表格读取
+# ============================================
+class _TableHTMLParser(HTMLParser):
+    """提取 HTML 页面中的所有表格（处理 rowspan / colspan），以及页面全部文字"""
+
+    def __init__(self):
+        super().__init__()
+        self.tables: List[List[List[str]]] = []
+        self.text: List[str] = []
+        self._stack: List[dict] = []
+        self._cell: Optional[List[str]] = None
+        self._cell_span = (1, 1)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "table":
+            self._stack.append({"rows": [], "row": None, "pending": {}})
+        elif not self._stack:
+            return
+        elif tag == "tr":
+            self._stack[-1]["row"] = []
+        elif tag in ("td", "th"):
+            self._cell = []
+            self._cell_span = (self._span(attrs.get("rowspan")), self._span(attrs.get("colspan")))
+        elif tag == "br" and self._cell is not None:
+            self._cell.append("\n")
+
+    def handle_endtag(self, tag):
+        if not self._stack:
+            return
+        table = self._stack[-1]
+        if tag in ("td", "th") and self._cell is not None and table["row"] is not None:
+            self._place_cell(table, "".join(self._cell).strip())
+            self._cell = None
+        elif tag == "tr" and table["row"] is not None:
+            self._fill_pending(table)
+            table["rows"].append(table["row"])
+            table["row"] = None
+        elif tag == "table":
+            self.tables.append(self._stack.pop()["rows"])
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+        if data.strip():
+            self.text.append(data.strip())
+
+    @staticmethod
+    def _span(value) -> int:
+        try:
+            return max(1, int(value))
+        except (TypeError, ValueError):
+            return 1
+
+    @staticmethod
+    def _fill_pending(table: dict):
+        """把上方 rowspan 延续下来的单元格补到当前行"""
+        row, pending = table["row"], table["pending"]
+        while len(row) in pending:
+            col = len(row)
+            text, remaining = pending[col]
+            row.append(text)
+            if remaining <= 1:
+                del pending[col]
+            else:
+                pending[col] = (text, remaining - 1)
+
+    def _place_cell(self, table: dict, text: str):
+        row = table["row"]
+        self._fill_pending(table)
+        rowspan, colspan = self._cell_span
+        for _ in range(colspan):
+            if rowspan > 1:
+                table["pending"][len(row)] = (text, rowspan - 1)
+            row.append(text)
+
+
+def read_csv_grid(path: str) -> Tuple[List[List[str]], str]:
+    """读取 CSV，返回 (表格行, 表格前的说明文字)"""
+    for encoding in ("utf-8-sig", "gbk"):
+        try:
+            with open(path, 'r', encoding=encoding, newline='') as f:
+                rows = [[cell.strip() for cell in row] for row in csv.reader(f)]
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise ValueError("无法识别文件编码（支持 UTF-8 / GBK）")
+    return rows, "\n".join("：".join(cell for cell in row if cell) for row in rows)
+
+
+def read_html_grid(path: str) -> Tuple[List[List[str]], str]:
+    """读取 HTML 页面，返回 (含星期表头的课表表格, 页面文字)"""
+    for encoding in ("utf-8", "gbk"):
+        try:
+            with open(path, 'r', encoding=encoding) as f:
+                html = f.read()
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise ValueError("无法识别文件编码（支持 UTF-8 / GBK）")
+
+    parser = _TableHTMLParser()
+    parser.feed(html)
+    parser.close()
+    text = "\n".join(parser.text)
+    for table in parser.tables:
+        if _locate_header(table) is not None:
+            return table, text
+    raise ValueError("页面中未找到带星期表头的课表表格")
+
+
+def _locate_header(rows: List[List[str]]) -> Optional[Tuple[int, bool]]:
+    """查找星期表头所在行，返回 (行号, 是否需要转置)"""
+    for index, row in enumerate(rows):
+        if sum(parse_weekday(cell) is not None for cell in row) >= 5:
+            return index, False
+    first_column = [row[0] if row else "" for row in rows]
+    if sum(parse_weekday(cell) is not None for cell in first_column) >= 5:
+        return 0, True
+    return None
+
+
+# ============================================
+# 四、单个文件 → 课表记录
+# ============================================
+def _extract_meta(text: str) -> Dict:
+    meta = {}
+    for label, field in META_FIELDS.items():
+        match = re.search(label + r"\s*[:：]+\s*([^\s:：,，]+)", text)
+        if match:
+            meta[field] = match.group(1)
+    return meta
+
+
+def _cell_courses(text: str, row_periods: List[int]) -> List[Tuple[List[int], List[int]]]:
+    """
+    将单元格拆分为若干 (节次, 周次)；一个单元格可能包含多门课程。
+    节次或周次解析为空的课程也会返回，由调用方报告错误
+
+    >>> _cell_courses("高数 1-16周[1-2节]\\n英语 2-4周[3-4节]", [])
+    [([1, 2], [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16]), ([3, 4], [2, 3, 4])]
+    >>> _cell_courses("[1-2节]高数 1-2周\\n[3-4节]英语 3-4周", [])
+    [([1, 2], [1, 2]), ([3, 4], [3, 4])]
+    >>> _cell_courses("高数 1-2周\\n单片机原理 3-4周", [5, 6])
+    [([5, 6], [1, 2]), ([5, 6], [3, 4])]
+    """
+    matches = list(WEEK_PATTERN.finditer(text))
+    # 同一导出文件中节次的位置是固定的：第一门课程的周次之前有节次，说明节次写在周次之前
+    # （“[1-2节]高数 1-16周”），否则写在周次之后（“高数 1-16周[1-2节]”）。
+    # 每门课程只在自己一侧查找节次，不会读到相邻课程的节次
+    periods_first = bool(matches) and PERIOD_PATTERN.search(text[:matches[0].start()]) is not None
+    courses = []
+    for i, match in enumerate(matches):
+        if periods_first:
+            segment = text[matches[i - 1].end() if i > 0 else 0:match.start()]
+        else:
+            segment = text[match.end():matches[i + 1].start() if i + 1 < len(matches) else len(text)]
+        periods = parse_periods(segment) if PERIOD_PATTERN.search(segment) else row_periods
+        courses.append((periods, parse_week_range(match.group(0))))
+    return courses
+
+
+def grid_to_table(rows: List[List[str]], periods: int = PERIOD_COUNT,
+                  weekdays: int = WEEKDAY_COUNT, weeks: int = WEEK_COUNT) -> List:
+    """将课表网格转换为 节次×星期×周次 的 0/1 数组"""
+    located = _locate_header(rows)
+    if located is None:
+        raise ValueError("未找到星期表头（星期一 ~ 星期日）")
+    header_index, transpose = located
+    if transpose:
+        width = max(len(row) for row in rows)
+        rows = [[row[i] if i < len(row) else "" for row in rows] for i in range(width)]
+
+    header = rows[header_index]
+    columns = {col: parse_weekday(cell) for col, cell in enumerate(header)}
+    columns = {col: day for col, day in columns.items() if day is not None and day < weekdays}
+
+    table = [[[0] * weeks for _ in range(weekdays)] for _ in range(periods)]
+    unparsed = []
+    for row in rows[header_index + 1:]:
+        if not row:
+            continue
+        row_periods = parse_periods(row[0])
+        for col, weekday in columns.items():
+            if col >= len(row) or not row[col].strip():
+                continue
+            courses = _cell_courses(row[col], row_periods)
+            if not courses or not all(course_periods and course_weeks for course_periods, course_weeks in courses):
+                # 有内容却解析不出节次 / 周次，多半是写法不支持，不能当作无课
+                unparsed.append(f"{header[col].strip()} {row[0].strip()}: {row[col].strip()}")
+                continue
+            for course_periods, course_weeks in courses:
+                for period in course_periods:
+                    if not 1 <= period <= periods:
+                        continue
+                    for week in course_weeks:
+                        table[period - 1][weekday][week - 1] = 1
+    if unparsed:
+        shown = "；".join(unparsed[:3])
+        more = f" 等{len(unparsed)}处" if len(unparsed) > 3 else ""
+        raise ValueError(f"无法识别节次或周次的单元格: {shown}{more}")
+    return table
+
+
+def import_file(path: str) -> Dict:
+    """读取单个导出文件，返回 all_schedules.json 格式的记录"""
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix == ".csv":
+        rows, text = read_csv_grid(path)
+    elif suffix in (".html", ".htm"):
+        rows, text = read_html_grid(path)
+    else:
+        raise ValueError(f"不支持的文件类型: {suffix}")
+
+    meta = _extract_meta(text)
+    record = {
+        "name": meta.get("name") or os.path.splitext(os.path.basename(path))[0],
+        "semester": meta.get("semester", ""),
+        "class_name": meta.get("class_name", ""),
+        "major": meta.get("major", ""),
+        "college": meta.get("college", ""),
+        "table": grid_to_table(rows),
+    }
+    return record
+
+
+# ============================================
+# 五、目录批量导入（进程池）
+# ============================================
+def import_directory(source_dir: str, output_path: str, workers: Optional[int] = None,
+                     progress=print) -> Tuple[List[Dict], List[Tuple[str, str]]]:
+    """
+    并行导入目录下全部课表文件并写入 output_path
+    返回 (成功的记录列表, [(文件名, 错误信息)])
+    """
+    files = sorted(
+        os.path.join(source_dir, name) for name in os.listdir(source_dir)
+        if name.lower().endswith(SUPPORTED_SUFFIXES)
+    )
+    if not files:
+        raise FileNotFoundError(f"目录中没有可导入的课表文件: {source_dir}")
+
+    results: Dict[str, Dict] = {}
+    errors: List[Tuple[str, str]] = []
+    started = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(import_file, path): path for path in files}
+        for done, future in enumerate(as_completed(futures), start=1):
+            path = futures[future]
+            name = os.path.basename(path)
+            try:
+                results[path] = future.result()
+                progress(f"[{done}/{len(files)}] ✅ {name}")
+            except Exception as e:
+                errors.append((name, str(e)))
+                progress(f"[{done}/{len(files)}] ❌ {name}: {e}")
+
+    # 按文件名排序输出，保证每次导入顺序一致
+    records = [results[path] for path in files if path in results]
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(records, f, ensure_ascii=False, indent=2)
+
+    progress(f"📁 已写入 {len(records)} 个课表: {os.path.abspath(output_path)} "
+             f"(耗时 {time.time() - started:.1f}s)")
+    if errors:
+        progress(f"⚠️ {len(errors)} 个文件导入失败:")
+        for name, message in errors:
+            progress(f"   {name}: {message}")
+    return records, errors
+
+
+# ============================================
+# 六、命令行入口
+# ============================================
+if __name__ == "__main__":
+    default_output = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schedule", "all_schedules.json")
+
+    arg_parser = argparse.ArgumentParser(description="从教务系统导出的课表文件批量生成 all_schedules.json")
+    arg_parser.add_argument("source_dir", help="课表文件所在目录（CSV / HTML）")
+    arg_parser.add_argument("-o", "--output", default=default_output, help="输出文件路径")
+    arg_parser.add_argument("-j", "--workers", type=int, default=None, help="并行进程数（默认 CPU 核数）")
+    args = arg_parser.parse_args()
+
+    _, failed = import_directory(args.source_dir, args.output, args.workers)
+    raise SystemExit(1 if failed else 0)